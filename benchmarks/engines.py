@@ -0,0 +1,73 @@
+"""Compare the speed of the rewrite engines and of checking with ``--check``.
+
+Run with ``python benchmarks/engines.py``.
+"""
+
+from __future__ import annotations
+
+import functools
+import timeit
+
+from protoletariat.rewrite import (
+    ENGINES,
+    ImportRewriter,
+    build_rewrites,
+    contains_import,
+)
+
+NUMBER = 100
+NDEPS = 50
+
+
+def _source() -> str:
+    """Construct a module that looks like the output of protoc."""
+    lines = [
+        '"""Generated protocol buffer code."""',
+        "from google.protobuf import descriptor as _descriptor",
+        "from google.protobuf import symbol_database as _symbol_database",
+    ]
+    lines.extend(
+        f"from deps import dep{i}_pb2 as deps_dot_dep{i}__pb2" for i in range(NDEPS)
+    )
+    lines.append("_sym_db = _symbol_database.Default()")
+    lines.extend(
+        f"_MESSAGE{i} = DESCRIPTOR.message_types_by_name['Message{i}']"
+        for i in range(10 * NDEPS)
+    )
+    return "\n".join(lines) + "\n"
+
+
+def _rewriter(engine: str) -> ImportRewriter:
+    rewriter = ENGINES[engine]()
+    for i in range(NDEPS):
+        for replacement in build_rewrites("a/b", f"deps/dep{i}"):
+            rewriter.register_rewrite(replacement)
+    return rewriter
+
+
+def main() -> None:
+    src = _source()
+    for engine in ENGINES:
+        rewriter = _rewriter(engine)
+        seconds = min(
+            timeit.repeat(functools.partial(rewriter.rewrite, src), number=NUMBER)
+        )
+        print(f"{engine}: {seconds / NUMBER * 1e3:.3f} ms per module")
+
+    # an up-to-date module is the worst case, every line has to be scanned
+    rewritten = _rewriter("regex").rewrite(src)
+    old_imports = frozenset(
+        replacement.old
+        for i in range(NDEPS)
+        for replacement in build_rewrites("a/b", f"deps/dep{i}")
+    )
+    seconds = min(
+        timeit.repeat(
+            functools.partial(contains_import, rewritten, old_imports), number=NUMBER
+        )
+    )
+    print(f"check: {seconds / NUMBER * 1e3:.3f} ms per module")
+
+
+if __name__ == "__main__":
+    main()
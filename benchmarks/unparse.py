@@ -0,0 +1,55 @@
+"""Compare the speed of converting import statements to source code.
+
+Run with ``python benchmarks/unparse.py``.
+"""
+
+from __future__ import annotations
+
+import ast
+import timeit
+from typing import TYPE_CHECKING
+
+from protoletariat.rewrite import astunparse, build_rewrites, unparse_import
+
+if TYPE_CHECKING:
+    from typing import Callable
+
+NUMBER = 1_000
+
+
+def _imports() -> list[ast.Import | ast.ImportFrom]:
+    """Parse the imports produced by rewriting a range of proto files."""
+    protos = ["a", "a/b", "a/b/c", "a_b/c_d/e"]
+    deps = ["d", "d/e", "d/e/f_g", "google/protobuf/empty"]
+    nodes = []
+    for proto in protos:
+        for dep in deps:
+            for replacement in build_rewrites(proto, dep, is_public=True):
+                for code in replacement:
+                    (node,) = ast.parse(code).body
+                    assert isinstance(node, (ast.Import, ast.ImportFrom))
+                    nodes.append(node)
+    return nodes
+
+
+def _time(
+    func: Callable[[ast.Import | ast.ImportFrom], str],
+    nodes: list[ast.Import | ast.ImportFrom],
+) -> float:
+    """Return the best time of one call of `func` on every node in `nodes`."""
+    return min(timeit.repeat(lambda: list(map(func, nodes)), number=NUMBER)) / NUMBER
+
+
+def main() -> None:
+    nodes = _imports()
+    candidates: dict[str, Callable[[ast.Import | ast.ImportFrom], str]] = {
+        "protoletariat.rewrite.unparse_import": unparse_import,
+        f"{astunparse.__module__}.{astunparse.__name__}": astunparse,
+    }
+    for name, func in candidates.items():
+        per_import = _time(func, nodes) / len(nodes)
+        print(f"{name}: {per_import * 1e6:.3f} us per import")
+
+
+if __name__ == "__main__":
+    main()
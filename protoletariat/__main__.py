@@ -2,18 +2,35 @@
 
 from __future__ import annotations
 
+import contextlib
 import os
 import sys
+import zipfile
 from pathlib import Path
-from typing import IO, TYPE_CHECKING
+from typing import IO, TYPE_CHECKING, Callable
 
 import click
 
-from .fdsetgen import Buf, Protoc, Raw
+from .archive import ARCHIVE_FORMATS, ArchiveWriter
+from .fdsetgen import (
+    DEFAULT_MODULE_SUFFIXES,
+    EXECUTORS,
+    Buf,
+    DescriptorSetConflictError,
+    Protoc,
+    Raw,
+    Scan,
+    UnmatchedRootsError,
+)
+from .rewrite import ENGINES, EngineMismatchError
+from .store import LINK_MODES
+from .timings import Timings
 
 if TYPE_CHECKING:
     from collections.abc import Iterable
 
+    from .fdsetgen import FileDescriptorSetGenerator
+
 
 def _overwrite(python_file: Path, code: str) -> None:
     python_file.write_text(code)
@@ -31,14 +48,16 @@ def _echo(_: Path, code: str) -> None:
 @click.option(
     "-o",
     "--python-out",
-    required=True,
     type=click.Path(
-        file_okay=False,
+        file_okay=True,
         dir_okay=True,
         exists=True,
         path_type=Path,
     ),
-    help="Directory containing protoc or buf-generated Python code",
+    help=(
+        "Directory, zip archive or wheel containing protoc or buf-generated "
+        "Python code. Required by the commands that rewrite imports"
+    ),
 )
 @click.option(
     "--in-place/--not-in-place",
@@ -57,7 +76,7 @@ def _echo(_: Path, code: str) -> None:
     "--module-suffixes",
     type=str,
     multiple=True,
-    default=["_pb2.py", "_pb2.pyi", "_pb2_grpc.py", "_pb2_grpc.pyi"],
+    default=DEFAULT_MODULE_SUFFIXES,
     help="Suffixes of Python/mypy modules to process",
     show_default=True,
 )
@@ -77,32 +96,476 @@ def _echo(_: Path, code: str) -> None:
         "Multiple values are allowed"
     ),
 )
+@click.option(
+    "--archive-root",
+    type=str,
+    default="",
+    help="Directory inside a `--python-out` archive containing the generated code",
+)
+@click.option(
+    "--daemon-socket",
+    envvar="PROTOL_DAEMON_SOCKET",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=None,
+    show_envvar=True,
+    help="Send rewrite requests to the `protol serve` process listening on this socket",
+)
+@click.option(
+    "--watch/--no-watch",
+    default=False,
+    help=(
+        "After rewriting, keep polling `--python-out` and rewrite generated "
+        "modules as they change"
+    ),
+    show_default=True,
+)
+@click.option(
+    "--poll-interval",
+    type=click.FloatRange(min=0, min_open=True),
+    default=1.0,
+    help="Seconds between passes over `--python-out` when using `--watch`",
+    show_default=True,
+)
+@click.option(
+    "--output-format",
+    type=click.Choice(["code", *ARCHIVE_FORMATS]),
+    default="code",
+    help=(
+        "Format of the output written to stdout with `--not-in-place`. "
+        "`code` echoes each module, the others write a single archive of "
+        "modules named relative to `--python-out`"
+    ),
+    show_default=True,
+)
+@click.option(
+    "--index",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=None,
+    help=(
+        "Index of previous rewrites. Proto files whose imports and "
+        "generated modules are unchanged since they were last rewritten are "
+        "skipped, then the index is updated"
+    ),
+)
+@click.option(
+    "--changed",
+    type=str,
+    multiple=True,
+    default=[],
+    help=(
+        "Only process the generated modules of this proto file, "
+        "e.g., `a/b.proto`, like an `--only` pattern matching exactly that "
+        "name. Multiple values are allowed"
+    ),
+)
+@click.option(
+    "--timings/--no-timings",
+    default=False,
+    help="Print the time spent in each phase of rewriting to stderr",
+    show_default=True,
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=None,
+    help=(
+        "Number of workers to rewrite modules with, or of manifest entries "
+        "processed at once by `batch`. Rewrite serially if not given"
+    ),
+)
+@click.option(
+    "--executor",
+    type=click.Choice(EXECUTORS),
+    default="thread",
+    help=(
+        "Kind of worker used with `--jobs`. Threads avoid process startup and "
+        "pickling, and run in parallel on free-threaded Python"
+    ),
+    show_default=True,
+)
+@click.option(
+    "--engine",
+    type=click.Choice(list(ENGINES)),
+    default="ast",
+    help=(
+        "How to rewrite imports. `ast` reformats whole modules, `tokenize` "
+        "and `regex` only edit import statements and are faster"
+    ),
+    show_default=True,
+)
+@click.option(
+    "--verify-engine",
+    type=click.Choice(list(ENGINES)),
+    default=None,
+    help=(
+        "Also rewrite every module with this engine and fail if the result "
+        "isn't equivalent to that of `--engine`"
+    ),
+)
+@click.option(
+    "--compile-bytecode/--no-compile-bytecode",
+    default=False,
+    help=(
+        "Write a .pyc for every rewritten module from its new source, using "
+        "the workers given by `--jobs`. Requires `--in-place`"
+    ),
+    show_default=True,
+)
+@click.option(
+    "--lazy-init/--empty-init",
+    default=False,
+    help=(
+        "Make the __init__.py files created by `--create-package` import "
+        "submodules on first attribute access"
+    ),
+    show_default=True,
+)
+@click.option(
+    "--explicit-reexports/--star-reexports",
+    default=False,
+    help=(
+        "Import the names of `import public` dependencies explicitly instead "
+        "of with star imports, and re-export them explicitly in stubs"
+    ),
+    show_default=True,
+)
+@click.option(
+    "-r",
+    "--root",
+    "roots",
+    type=str,
+    multiple=True,
+    default=[],
+    help=(
+        "Glob pattern of the proto files used directly, e.g., `api/*.proto`. "
+        "Only the modules of matching files and the files they transitively "
+        "import are rewritten. Multiple values are allowed"
+    ),
+)
+@click.option(
+    "--prune/--no-prune",
+    default=False,
+    help=(
+        "Delete the generated modules of proto files that aren't reachable "
+        "from `--root`. Requires `--in-place`"
+    ),
+    show_default=True,
+)
+@click.option(
+    "--only",
+    type=str,
+    multiple=True,
+    default=[],
+    help=(
+        "Glob pattern of the proto files, e.g., `a/*.proto`, or of their "
+        "modules relative to `--python-out`, e.g., `a/b_pb2.py`, to process. "
+        "Their imports of other files are still rewritten. Multiple values "
+        "are allowed"
+    ),
+)
+@click.option(
+    "--only-from",
+    type=click.File("r"),
+    default=None,
+    help=(
+        "Read `--only` patterns from this file, one per line, or from stdin "
+        "if `-`. Blank lines and lines starting with `#` are ignored"
+    ),
+)
+@click.option(
+    "--store",
+    type=click.Path(file_okay=False, path_type=Path),
+    default=None,
+    help=(
+        "Directory of a store of rewritten modules shared by output trees, "
+        "e.g., of several worktrees. Modules whose inputs are in the store "
+        "are linked from it instead of being rewritten. Requires `--in-place`"
+    ),
+)
+@click.option(
+    "--store-link",
+    type=click.Choice(LINK_MODES),
+    default=None,
+    help=(
+        "How modules are materialized from `--store`. Hardlinked modules are "
+        "read-only and must be deleted, not written to, before generating "
+        "code again  [default: copy]"
+    ),
+)
+@click.option(
+    "--check/--no-check",
+    default=False,
+    help=(
+        "Write nothing and exit with status 1 if a generated module under "
+        "`--python-out` still has imports that need rewriting"
+    ),
+    show_default=True,
+)
+@click.option(
+    "--all",
+    "check_all",
+    is_flag=True,
+    default=False,
+    help="Report every out-of-date module with `--check`, not only the first",
+)
 @click.pass_context
 def main(
     ctx: click.Context,
-    python_out: Path,
+    *,
+    python_out: Path | None,
     in_place: bool,
     create_package: bool,
     module_suffixes: list[str],
     exclude_google_imports: bool,
     exclude_imports_glob: list[str],
+    archive_root: str,
+    daemon_socket: Path | None,
+    watch: bool,
+    poll_interval: float,
+    output_format: str,
+    index: Path | None,
+    changed: list[str],
+    timings: bool,
+    jobs: int | None,
+    executor: str,
+    engine: str,
+    verify_engine: str | None,
+    compile_bytecode: bool,
+    lazy_init: bool,
+    explicit_reexports: bool,
+    roots: list[str],
+    prune: bool,
+    only: list[str],
+    only_from: IO[str] | None,
+    store: Path | None,
+    store_link: str | None,
+    check: bool,
+    check_all: bool,
 ) -> None:
     ctx.ensure_object(dict)
 
+    if store is not None and not in_place:
+        raise click.UsageError("--store requires --in-place", ctx=ctx)
+
+    if store_link is not None and store is None:
+        raise click.UsageError("--store-link requires --store", ctx=ctx)
+
+    if check_all and not check:
+        raise click.UsageError("--all requires --check", ctx=ctx)
+
+    if check and (in_place or output_format != "code"):
+        raise click.UsageError(
+            "--check cannot be combined with --in-place or an archive --output-format",
+            ctx=ctx,
+        )
+
+    if in_place and output_format != "code":
+        raise click.UsageError(
+            "an archive --output-format cannot be combined with --in-place", ctx=ctx
+        )
+
+    if compile_bytecode and not in_place:
+        raise click.UsageError("--compile-bytecode requires --in-place", ctx=ctx)
+
+    if prune and not (roots and in_place):
+        raise click.UsageError("--prune requires --root and --in-place", ctx=ctx)
+
     if exclude_google_imports:
         exclude_imports_glob += ("google/protobuf/*",)
 
+    if only_from is not None:
+        only += tuple(
+            line
+            for line in map(str.strip, only_from)
+            if line and not line.startswith("#")
+        )
+
+    if python_out is not None:
+        python_out = Path(os.fsdecode(python_out))
+
+    overwrite_callback: Callable[[Path, str], None]
+    if in_place:
+        overwrite_callback = _overwrite
+    elif output_format == "code" or python_out is None:
+        overwrite_callback = _echo
+    else:
+        overwrite_callback = ArchiveWriter(
+            sys.stdout.buffer, root=python_out, format=output_format
+        )
+
     ctx.obj.update(
         dict(
-            python_out=Path(os.fsdecode(python_out)),
+            python_out=python_out,
+            archive_root=archive_root,
+            daemon_socket=daemon_socket,
+            watch=watch,
+            poll_interval=poll_interval,
             create_package=create_package,
-            overwrite_callback=_overwrite if in_place else _echo,
+            overwrite_callback=overwrite_callback,
             module_suffixes=module_suffixes,
             exclude_imports_glob=exclude_imports_glob,
+            index=index,
+            changed=changed or None,
+            timings=Timings() if timings else None,
+            jobs=jobs,
+            executor=executor,
+            engine=engine,
+            verify_engine=verify_engine,
+            compile_bytecode=compile_bytecode,
+            lazy_init=lazy_init,
+            explicit_reexports=explicit_reexports,
+            roots=roots or None,
+            prune=prune,
+            only=only if only or only_from is not None else None,
+            store=None if store is None else Path(os.fsdecode(store)),
+            store_link=store_link,
+            check=check,
+            check_all=check_all,
         )
     )
 
 
+# options that only apply to fixing imports of a `--python-out` directory in
+# a single pass, mapped to their flags
+_SINGLE_PASS_OPTIONS = {
+    "index": "--index",
+    "changed": "--changed",
+    "timings": "--timings",
+    "jobs": "--jobs",
+    "compile_bytecode": "--compile-bytecode",
+    "roots": "--root",
+    "prune": "--prune",
+    "only": "--only",
+    "store": "--store",
+    "store_link": "--store-link",
+}
+
+
+def _reject_options(
+    ctx: click.Context, options: dict[str, object], *, reason: str
+) -> None:
+    for key, value in options.items():
+        if value:
+            flag = _SINGLE_PASS_OPTIONS[key]
+            raise click.UsageError(f"{flag} cannot be combined with {reason}", ctx=ctx)
+
+
+def _python_out(ctx: click.Context) -> Path:
+    python_out = ctx.obj["python_out"]
+    if python_out is None:
+        raise click.UsageError("Missing option '-o' / '--python-out'.", ctx=ctx)
+    return python_out
+
+
+def _fix_imports(ctx: click.Context, generator: FileDescriptorSetGenerator) -> None:
+    """Fix imports using `generator`, possibly by way of a `protol serve` process."""
+    try:
+        _dispatch_fix_imports(ctx, generator)
+    except (
+        EngineMismatchError,
+        DescriptorSetConflictError,
+        UnmatchedRootsError,
+    ) as e:
+        raise click.ClickException(str(e))
+
+
+def _dispatch_fix_imports(
+    ctx: click.Context, generator: FileDescriptorSetGenerator
+) -> None:
+    python_out = _python_out(ctx)
+    options = ctx.obj.copy()
+    archive_root = options.pop("archive_root")
+    daemon_socket = options.pop("daemon_socket")
+    watch = options.pop("watch")
+    poll_interval = options.pop("poll_interval")
+    executor = options.pop("executor")
+    check = options.pop("check")
+    check_all = options.pop("check_all")
+    overwrite_callback = options["overwrite_callback"]
+    single_pass_options = {key: options.pop(key) for key in _SINGLE_PASS_OPTIONS}
+    if check:
+        if not python_out.is_dir() or watch or daemon_socket is not None:
+            raise click.UsageError(
+                "--check requires a `--python-out` directory and cannot be "
+                "combined with --watch or --daemon-socket",
+                ctx=ctx,
+            )
+        _reject_options(ctx, single_pass_options, reason="--check")
+        stale = generator.check_imports(
+            python_out=python_out,
+            module_suffixes=options["module_suffixes"],
+            exclude_imports_glob=options["exclude_imports_glob"],
+            find_all=check_all,
+            explicit_reexports=options["explicit_reexports"],
+        )
+        for python_file in stale:
+            click.echo(f"would rewrite {python_file}", err=True)
+        if stale:
+            ctx.exit(1)
+    elif python_out.is_file():
+        if not zipfile.is_zipfile(python_out):
+            raise click.BadParameter(
+                f"{python_out} is neither a directory nor a zip archive",
+                ctx=ctx,
+                param_hint="'--python-out'",
+            )
+        if watch or daemon_socket is not None:
+            raise click.UsageError(
+                "--watch and --daemon-socket require a `--python-out` directory",
+                ctx=ctx,
+            )
+        _reject_options(ctx, single_pass_options, reason="an archive `--python-out`")
+        from .archive import fix_archive_imports  # noqa: PLC0415
+
+        fix_archive_imports(
+            generator,
+            archive=options.pop("python_out"),
+            archive_root=archive_root,
+            in_place=overwrite_callback is _overwrite,
+            **options,
+        )
+    elif watch:
+        if daemon_socket is not None:
+            raise click.UsageError(
+                "--watch cannot be combined with --daemon-socket", ctx=ctx
+            )
+        if isinstance(overwrite_callback, ArchiveWriter):
+            raise click.UsageError(
+                "--watch cannot be combined with an archive --output-format", ctx=ctx
+            )
+        _reject_options(ctx, single_pass_options, reason="--watch")
+        with contextlib.suppress(KeyboardInterrupt):
+            generator.watch(**options, poll_interval=poll_interval)
+    elif daemon_socket is None:
+        generator.fix_imports(**options, **single_pass_options, executor=executor)
+        timings = single_pass_options["timings"]
+        if timings is not None:
+            click.echo(timings.report(), err=True)
+    else:
+        _reject_options(
+            ctx,
+            {"timings": single_pass_options.pop("timings")},
+            reason="--daemon-socket",
+        )
+        from . import daemon  # noqa: PLC0415
+
+        try:
+            daemon.fix_imports(
+                daemon_socket,
+                generator,
+                in_place=overwrite_callback is _overwrite,
+                **options,
+                **single_pass_options,
+                executor=executor,
+            )
+        except (OSError, daemon.DaemonError) as e:
+            raise click.ClickException(f"daemon request failed: {e}")
+
+    if isinstance(overwrite_callback, ArchiveWriter):
+        overwrite_callback.close()
+
+
 @main.command(
     context_settings=dict(ignore_unknown_options=True),
     help="Use protoc to generate the FileDescriptorSet blob",
@@ -130,19 +593,40 @@ def main(
     ),
     help="Protobuf file search path(s). Accepts multiple values.",
 )
+@click.option(
+    "-d",
+    "--descriptor-set-in",
+    "descriptor_sets_in",
+    multiple=True,
+    type=click.Path(
+        file_okay=True,
+        dir_okay=False,
+        exists=True,
+        path_type=Path,
+    ),
+    help=(
+        "Prebuilt FileDescriptorSet(s) of dependencies, passed to protoc's "
+        "`--descriptor_set_in` so that they aren't recompiled. Accepts multiple values."
+    ),
+)
 @click.argument("protoc_args", nargs=-1, type=click.UNPROCESSED)
 @click.pass_context
 def protoc(
     ctx: click.Context,
     protoc_path: str,
     proto_paths: list[Path],
+    descriptor_sets_in: list[Path],
     protoc_args: Iterable[str],
 ) -> None:
-    Protoc(
-        protoc_path=os.fsdecode(protoc_path),
-        proto_paths=[Path(os.fsdecode(proto_path)) for proto_path in proto_paths],
-        protoc_args=list(protoc_args),
-    ).fix_imports(**ctx.obj)
+    _fix_imports(
+        ctx,
+        Protoc(
+            protoc_path=os.fsdecode(protoc_path),
+            proto_paths=[Path(os.fsdecode(proto_path)) for proto_path in proto_paths],
+            protoc_args=list(protoc_args),
+            descriptor_sets_in=[Path(os.fsdecode(path)) for path in descriptor_sets_in],
+        ),
+    )
 
 
 @main.command(help="Use buf to generate the FileDescriptorSet blob")
@@ -158,14 +642,222 @@ def protoc(
 @click.argument("input", type=str, default=os.curdir)
 @click.pass_context
 def buf(ctx: click.Context, buf_path: str, input: str) -> None:
-    Buf(buf_path=os.fsdecode(buf_path), input=os.fsdecode(input)).fix_imports(**ctx.obj)
+    _fix_imports(ctx, Buf(buf_path=os.fsdecode(buf_path), input=os.fsdecode(input)))
 
 
-@main.command(help="Rewrite imports using FileDescriptorSet bytes from a file or stdin")
-@click.argument("descriptor_set_bytes", type=click.File("rb"), default=sys.stdin.buffer)
+@main.command(
+    help=(
+        "Rewrite imports using FileDescriptorSet bytes from files or stdin. "
+        "Multiple sets are merged, keeping each proto file once"
+    )
+)
+@click.argument("descriptor_set_bytes", type=click.File("rb"), nargs=-1)
+@click.pass_context
+def raw(ctx: click.Context, descriptor_set_bytes: tuple[IO[bytes], ...]) -> None:
+    files = descriptor_set_bytes or (sys.stdin.buffer,)
+    _fix_imports(ctx, Raw(*(f.read() for f in files)))
+
+
+@main.command(
+    help=(
+        "Collect the FileDescriptorSet from the descriptors embedded in the "
+        "generated modules under `--python-out`"
+    )
+)
 @click.pass_context
-def raw(ctx: click.Context, descriptor_set_bytes: IO[bytes]) -> None:
-    Raw(descriptor_set_bytes.read()).fix_imports(**ctx.obj)
+def scan(ctx: click.Context) -> None:
+    _fix_imports(
+        ctx,
+        Scan(python_out=_python_out(ctx), archive_root=ctx.obj["archive_root"]),
+    )
+
+
+@main.command(
+    help=(
+        "Fix imports of every output tree listed in a JSON manifest in a "
+        "single process. Entries name a generator (protoc, buf or raw), its "
+        "`python_out` and arguments, and may override the options given here. "
+        "`--jobs` sets the number of entries processed at once"
+    )
+)
+@click.argument(
+    "manifest", type=click.Path(exists=True, dir_okay=False, path_type=Path)
+)
+@click.pass_context
+def batch(ctx: click.Context, manifest: Path) -> None:
+    options = ctx.obj.copy()
+    if options.pop("python_out") is not None:
+        raise click.UsageError(
+            "--python-out cannot be combined with batch; "
+            "each manifest entry names its own",
+            ctx=ctx,
+        )
+    if options.pop("overwrite_callback") is not _overwrite:
+        raise click.UsageError("batch requires --in-place", ctx=ctx)
+    if options.pop("watch") or options.pop("daemon_socket") is not None:
+        raise click.UsageError(
+            "--watch and --daemon-socket cannot be combined with batch", ctx=ctx
+        )
+    if options.pop("check"):
+        raise click.UsageError("--check cannot be combined with batch", ctx=ctx)
+    del options["check_all"]
+    if options.pop("executor") != "thread":
+        raise click.UsageError(
+            "batch processes entries in threads; --executor cannot be changed",
+            ctx=ctx,
+        )
+    _reject_options(
+        ctx,
+        {key: options.pop(key) for key in ("index", "changed")},
+        reason="batch; set `index` in manifest entries instead",
+    )
+    del options["archive_root"], options["poll_interval"]
+
+    from .batch import BatchError, fix_batch_imports, load_manifest  # noqa: PLC0415
+
+    try:
+        fix_batch_imports(
+            load_manifest(Path(os.fsdecode(manifest))),
+            overwrite_callback=_overwrite,
+            **options,
+        )
+    except BatchError as e:
+        raise click.ClickException(str(e))
+
+    timings = options["timings"]
+    if timings is not None:
+        click.echo(timings.report(), err=True)
+
+
+@main.command(
+    "import-profile",
+    help=(
+        "Import every generated module under `--python-out` in a subprocess "
+        "with `-X importtime` and report the slowest modules and the heaviest "
+        "import chains"
+    ),
+)
+@click.option(
+    "-n",
+    "--top",
+    type=click.IntRange(min=1),
+    default=10,
+    show_default=True,
+    help="Number of modules and import chains to report",
+)
+@click.pass_context
+def import_profile(ctx: click.Context, top: int) -> None:
+    python_out = _python_out(ctx)
+    if not python_out.is_dir():
+        raise click.BadParameter(
+            f"{python_out} is not a directory", ctx=ctx, param_hint="'--python-out'"
+        )
+
+    from google.protobuf.descriptor_pb2 import FileDescriptorSet  # noqa: PLC0415
+
+    from . import importprofile  # noqa: PLC0415
+    from .graph import DependencyGraph  # noqa: PLC0415
+
+    fdset = FileDescriptorSet.FromString(
+        Scan(python_out=python_out).generate_file_descriptor_set_bytes()
+    )
+    modules = importprofile.module_names(python_out, ctx.obj["module_suffixes"])
+    try:
+        times = importprofile.profile_imports(python_out, modules)
+    except importprofile.ImportProfileError as e:
+        raise click.ClickException(f"failed to import generated modules:\n{e}")
+
+    click.echo(
+        importprofile.format_report(
+            times,
+            DependencyGraph.from_file_descriptor_set(fdset),
+            package=python_out.name,
+            top=top,
+        )
+    )
+
+
+@main.command(
+    help=(
+        "Report import cycles, the most imported and importing proto files, "
+        "the longest import chains and the size of the transitive closure of "
+        "each file. Uses FileDescriptorSet bytes from files if given, "
+        "otherwise the descriptors embedded in the modules under `--python-out`"
+    ),
+)
+@click.argument("descriptor_set_bytes", type=click.File("rb"), nargs=-1)
+@click.option(
+    "-f",
+    "--format",
+    "report_format",
+    type=click.Choice(["text", "json", "dot"]),
+    default="text",
+    show_default=True,
+    help="Format of the report. `dot` draws the whole graph, marking cycles in red",
+)
+@click.option(
+    "-n",
+    "--top",
+    type=click.IntRange(min=1),
+    default=10,
+    show_default=True,
+    help="Number of hotspots and import chains to report",
+)
+@click.pass_context
+def graph(
+    ctx: click.Context,
+    descriptor_set_bytes: tuple[IO[bytes], ...],
+    report_format: str,
+    top: int,
+) -> None:
+    generator: FileDescriptorSetGenerator
+    if descriptor_set_bytes:
+        generator = Raw(*(f.read() for f in descriptor_set_bytes))
+    else:
+        generator = Scan(
+            python_out=_python_out(ctx), archive_root=ctx.obj["archive_root"]
+        )
+    try:
+        fdset_bytes = generator.generate_file_descriptor_set_bytes()
+    except DescriptorSetConflictError as e:
+        raise click.ClickException(str(e))
+
+    from google.protobuf.descriptor_pb2 import FileDescriptorSet  # noqa: PLC0415
+
+    from .graph import DependencyGraph, analyze, format_dot, format_json, format_text  # noqa: PLC0415
+
+    dependency_graph = DependencyGraph.from_file_descriptor_set(
+        FileDescriptorSet.FromString(fdset_bytes)
+    )
+    report = analyze(dependency_graph, top=top)
+    if report_format == "json":
+        click.echo(format_json(report))
+    elif report_format == "dot":
+        click.echo(format_dot(dependency_graph, report))
+    else:
+        click.echo(format_text(report, top=top))
+
+
+@main.command(help="Serve rewrite requests from `--daemon-socket` clients")
+@click.option(
+    "--socket",
+    "socket_path",
+    envvar="PROTOL_DAEMON_SOCKET",
+    required=True,
+    type=click.Path(dir_okay=False, path_type=Path),
+    show_envvar=True,
+    help="Path of the Unix domain socket to listen on",
+)
+def serve(socket_path: Path) -> None:
+    from . import daemon  # noqa: PLC0415
+
+    try:
+        server = daemon.Server(socket_path)
+    except (OSError, daemon.DaemonError) as e:
+        raise click.ClickException(f"failed to start server: {e}")
+
+    with server, contextlib.suppress(KeyboardInterrupt):
+        server.serve_forever()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,282 @@
+"""Archives of generated code."""
+
+from __future__ import annotations
+
+import base64
+import csv
+import hashlib
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import IO, TYPE_CHECKING, Callable
+
+from .packages import archive_prefix, lazy_init_source, pyi_init_source
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from .fdsetgen import FileDescriptorSetGenerator, RewriteCache
+
+ARCHIVE_FORMATS = ("tar", "zip")
+
+
+class ArchiveWriter:
+    """Collect rewritten modules into a single tar or zip archive.
+
+    Instances are meant to be used as the `overwrite_callback` of
+    :py:meth:`~protoletariat.fdsetgen.FileDescriptorSetGenerator.fix_imports`.
+    The archive is built in memory and written to `stream` in one go by
+    :py:meth:`close`.
+
+    Parameters
+    ----------
+    stream
+        Binary stream to write the archive to
+    root
+        Directory that member names are relative to
+    format
+        One of :py:data:`ARCHIVE_FORMATS`
+    """
+
+    def __init__(self, stream: IO[bytes], *, root: Path, format: str) -> None:
+        if format not in ARCHIVE_FORMATS:
+            raise ValueError(f"unsupported archive format: {format!r}")
+        self.stream = stream
+        self.root = root
+        self.format = format
+        self.buffer = io.BytesIO()
+        self.mtime = time.time()
+        self.archive: tarfile.TarFile | zipfile.ZipFile
+        if format == "tar":
+            # closed by `close`
+            self.archive = tarfile.open(fileobj=self.buffer, mode="w")  # noqa: SIM115
+        else:
+            self.archive = zipfile.ZipFile(
+                self.buffer, mode="w", compression=zipfile.ZIP_DEFLATED
+            )
+
+    def __call__(self, python_file: Path, code: str) -> None:
+        name = python_file.relative_to(self.root).as_posix()
+        data = code.encode()
+        if isinstance(self.archive, tarfile.TarFile):
+            tarinfo = tarfile.TarInfo(name)
+            tarinfo.size = len(data)
+            tarinfo.mtime = int(self.mtime)
+            self.archive.addfile(tarinfo, io.BytesIO(data))
+        else:
+            zipinfo = zipfile.ZipInfo(name, time.localtime(self.mtime)[:6])
+            zipinfo.compress_type = zipfile.ZIP_DEFLATED
+            self.archive.writestr(zipinfo, data)
+
+    def close(self) -> None:
+        """Finish the archive and write it to the stream."""
+        self.archive.close()
+        self.stream.write(self.buffer.getbuffer())
+        self.stream.flush()
+
+
+def fix_archive_imports(
+    generator: FileDescriptorSetGenerator,
+    *,
+    archive: Path,
+    archive_root: str,
+    in_place: bool,
+    create_package: bool,
+    overwrite_callback: Callable[[Path, str], None],
+    module_suffixes: Sequence[str],
+    exclude_imports_glob: Sequence[str],
+    cache: RewriteCache | None = None,
+    engine: str = "ast",
+    verify_engine: str | None = None,
+    lazy_init: bool = False,
+    explicit_reexports: bool = False,
+) -> None:
+    """Fix imports of generated code inside a zip archive or wheel.
+
+    Modules are read directly from the archive and rewritten in memory.
+
+    Parameters
+    ----------
+    generator
+        Generator of the descriptor set to rewrite imports with
+    archive
+        Path to a zip archive or a wheel
+    archive_root
+        ``/``-separated directory inside `archive` containing the generated
+        code. The empty string means the root of the archive.
+    in_place
+        Replace `archive` with a rewritten copy in a single pass over its
+        members. The `RECORD` of a wheel is updated to match. Otherwise
+        each rewritten module is passed to `overwrite_callback` as if it
+        lived under a directory named `archive`.
+    create_package
+        Add missing `__init__.py` files and `__init__.pyi` entries to the
+        rewritten archive. Only applies when `in_place` is `True`.
+    lazy_init
+        Make the added `__init__.py` files import submodules on first
+        access instead of leaving them empty
+    """
+    prefix = archive_prefix(archive_root)
+    with zipfile.ZipFile(archive) as zf:
+        sources = {
+            name[len(prefix) :]: zf.read(name).decode()
+            for name in zf.namelist()
+            if name.startswith(prefix) and name.endswith(tuple(module_suffixes))
+        }
+        rewritten = generator.rewrite_sources(
+            sources,
+            module_suffixes=module_suffixes,
+            exclude_imports_glob=exclude_imports_glob,
+            cache=cache,
+            engine=engine,
+            verify_engine=verify_engine,
+            explicit_reexports=explicit_reexports,
+        )
+
+        if not in_place:
+            for name, code in rewritten.items():
+                overwrite_callback(archive.joinpath(name), code)
+            return
+
+        files = {f"{prefix}{name}": code.encode() for name, code in rewritten.items()}
+        if create_package:
+            files.update(_package_files(zf, prefix, files, lazy_init=lazy_init))
+
+        fd, tmp = tempfile.mkstemp(dir=archive.parent, suffix=archive.suffix)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                _copy_archive(zf, f, files)
+            # keep the archive readable by whoever could read it before,
+            # rather than mkstemp's owner-only mode
+            shutil.copymode(archive, tmp)
+            os.replace(tmp, archive)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+def _package_files(
+    zf: zipfile.ZipFile, prefix: str, files: dict[str, bytes], *, lazy_init: bool
+) -> dict[str, bytes]:
+    """Compute the `__init__` files needed to make packages under `prefix`.
+
+    Directories whose names aren't valid identifiers, such as the
+    `.dist-info` directory of a wheel, are never turned into packages.
+    """
+    names = {name for name in zf.namelist() if not name.endswith("/")}
+    names.update(files)
+
+    # map each package directory to its entries
+    root = PurePosixPath(prefix)
+    packages: dict[PurePosixPath, set[tuple[PurePosixPath, bool]]] = {root: set()}
+    for name in names:
+        path = PurePosixPath(name)
+        if root not in path.parents:
+            continue
+        dirs = path.relative_to(root).parts[:-1]
+        if any(not d.isidentifier() or d == "__pycache__" for d in dirs):
+            continue
+
+        is_dir = False
+        while path != root:
+            packages.setdefault(path.parent, set()).add((path, is_dir))
+            path, is_dir = path.parent, True
+
+    has_pyi = any(name.endswith(".pyi") for name in names)
+    result = {}
+    for package, entries in packages.items():
+        init_py = str(package.joinpath("__init__.py"))
+        if lazy_init:
+            existing = _read_member(zf, files, init_py) if init_py in names else ""
+            source = lazy_init_source(existing, entries)
+            if source is not None and source != existing:
+                result[init_py] = source.encode()
+        elif init_py not in names:
+            result[init_py] = b""
+
+        if has_pyi:
+            init_pyi = str(package.joinpath("__init__.pyi"))
+            existing = _read_member(zf, files, init_pyi) if init_pyi in names else ""
+            source = pyi_init_source(existing, entries)
+            if source is not None:
+                result[init_pyi] = source.encode()
+            elif init_pyi not in names:
+                result[init_pyi] = b""
+    return result
+
+
+def _read_member(zf: zipfile.ZipFile, files: dict[str, bytes], name: str) -> str:
+    """Read `name` from `files`, falling back to the archive."""
+    try:
+        data = files[name]
+    except KeyError:
+        data = zf.read(name)
+    return data.decode()
+
+
+def _copy_archive(
+    src: zipfile.ZipFile, dst: IO[bytes], files: dict[str, bytes]
+) -> None:
+    """Copy `src` to `dst`, replacing or adding the members in `files`.
+
+    If `src` is a wheel its `RECORD` is updated and written last.
+    """
+    record_name = next(
+        (
+            name
+            for name in src.namelist()
+            if name.count("/") == 1 and name.endswith(".dist-info/RECORD")
+        ),
+        None,
+    )
+    with zipfile.ZipFile(dst, mode="w", compression=zipfile.ZIP_DEFLATED) as out:
+        for info in src.infolist():
+            if info.filename == record_name:
+                continue
+            data = files.get(info.filename)
+            if data is None:
+                out.writestr(info, src.read(info))
+            else:
+                out.writestr(info, data)
+
+        date_time = time.localtime()[:6]
+        existing = set(src.namelist())
+        for name, data in files.items():
+            if name not in existing:
+                info = zipfile.ZipInfo(name, date_time)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                out.writestr(info, data)
+
+        if record_name is not None:
+            out.writestr(
+                src.getinfo(record_name),
+                _update_record(src.read(record_name).decode(), files),
+            )
+
+
+def _record_hash(data: bytes) -> str:
+    """Compute a wheel `RECORD` hash of `data`.
+
+    Examples
+    --------
+    >>> _record_hash(b"")
+    'sha256=47DEQpj8HBSa-_TImW-5JCeuQeRkm5NMpJWZG3hSuFU'
+    """
+    digest = base64.urlsafe_b64encode(hashlib.sha256(data).digest())
+    return f"sha256={digest.rstrip(b'=').decode()}"
+
+
+def _update_record(record: str, files: dict[str, bytes]) -> str:
+    """Update the hashes and sizes in a wheel `RECORD` for `files`."""
+    rows = {row[0]: row for row in csv.reader(io.StringIO(record)) if row}
+    for name, data in files.items():
+        rows[name] = [name, _record_hash(data), str(len(data))]
+
+    out = io.StringIO()
+    csv.writer(out, lineterminator="\n").writerows(rows.values())
+    return out.getvalue()
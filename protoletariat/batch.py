@@ -0,0 +1,239 @@
+"""Fix imports of many output trees in one process.
+
+A manifest is a JSON list of entries. Each entry is an object naming a
+``generator``, the ``python_out`` directory whose imports to fix, the
+arguments of the generator and, optionally, options overriding the ones given
+on the command line::
+
+    [
+        {
+            "generator": "protoc",
+            "python_out": "gen/a",
+            "proto_paths": ["protos"],
+            "protoc_args": ["protos/a/a.proto"]
+        },
+        {"generator": "buf", "python_out": "gen/b", "input": "protos/b"},
+        {
+            "generator": "raw",
+            "python_out": "gen/c",
+            "descriptor_set": "c.bin",
+            "create_package": true
+        }
+    ]
+
+The ``descriptor_set`` of a ``raw`` entry can also be a list of paths, in
+which case the sets are merged.
+
+Relative paths are relative to the current directory, as on the command line.
+Every entry shares a single :py:class:`~protoletariat.fdsetgen.RewriteCache`,
+so the rewriters of proto files that several entries depend on, such as
+common vendored protos, are only constructed once.
+"""
+
+from __future__ import annotations
+
+import concurrent.futures
+import json
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+from .fdsetgen import Buf, Protoc, Raw, RewriteCache
+from .rewrite import ENGINES
+from .timings import Timings
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from .fdsetgen import FileDescriptorSetGenerator
+
+GENERATORS = ("protoc", "buf", "raw")
+
+# options of `fix_imports` an entry may override, by the type of their value
+_BOOL_OPTIONS = frozenset(
+    {"create_package", "compile_bytecode", "lazy_init", "prune", "explicit_reexports"}
+)
+_LIST_OPTIONS = frozenset({"module_suffixes", "exclude_imports_glob", "roots", "only"})
+_ENGINE_OPTIONS = frozenset({"engine", "verify_engine"})
+_PATH_OPTIONS = frozenset({"index"})
+
+
+class BatchError(Exception):
+    """Raised when a manifest is malformed or one of its entries fails."""
+
+
+class Entry(NamedTuple):
+    """A single output tree of a manifest."""
+
+    generator: FileDescriptorSetGenerator
+    python_out: Path
+    options: dict[str, object]
+
+
+def load_manifest(path: Path) -> list[Entry]:
+    """Read and validate the manifest at `path`."""
+    try:
+        data = json.loads(path.read_text())
+    except json.JSONDecodeError as e:
+        raise BatchError(f"{path} is not valid JSON: {e}") from e
+    if not isinstance(data, list):
+        raise BatchError(f"{path} must contain a list of entries")
+    return [_parse_entry(i, entry) for i, entry in enumerate(data)]
+
+
+def _pop_str(
+    i: int, fields: dict[str, object], name: str, default: str | None = None
+) -> str:
+    value = fields.pop(name, default)
+    if value is None:
+        raise BatchError(f"entry {i} is missing {name!r}")
+    if not isinstance(value, str):
+        raise BatchError(f"entry {i} has an invalid value for {name!r}: {value!r}")
+    return value
+
+
+def _pop_list(
+    i: int, fields: dict[str, object], name: str, default: list[str] | None = None
+) -> list[str]:
+    value = fields.pop(name, default)
+    if value is None:
+        raise BatchError(f"entry {i} is missing {name!r}")
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        raise BatchError(f"entry {i} has an invalid value for {name!r}: {value!r}")
+    return value
+
+
+def _parse_entry(i: int, entry: object) -> Entry:
+    if not isinstance(entry, dict):
+        raise BatchError(f"entry {i} must be an object")
+
+    fields: dict[str, object] = dict(entry)
+    kind = fields.pop("generator", None)
+    python_out = Path(_pop_str(i, fields, "python_out"))
+    if not python_out.is_dir():
+        raise BatchError(f"entry {i}: {python_out} is not a directory")
+
+    generator: FileDescriptorSetGenerator
+    if kind == "protoc":
+        generator = Protoc(
+            protoc_path=_pop_str(
+                i, fields, "protoc_path", os.environ.get("PROTOC_PATH", "protoc")
+            ),
+            proto_paths=list(map(Path, _pop_list(i, fields, "proto_paths"))),
+            protoc_args=_pop_list(i, fields, "protoc_args"),
+            descriptor_sets_in=list(
+                map(Path, _pop_list(i, fields, "descriptor_sets_in", []))
+            ),
+        )
+    elif kind == "buf":
+        generator = Buf(
+            buf_path=_pop_str(i, fields, "buf_path", os.environ.get("BUF_PATH", "buf")),
+            input=_pop_str(i, fields, "input", os.curdir),
+        )
+    elif kind == "raw":
+        descriptor_sets = (
+            _pop_list(i, fields, "descriptor_set")
+            if isinstance(fields.get("descriptor_set"), list)
+            else [_pop_str(i, fields, "descriptor_set")]
+        )
+        try:
+            generator = Raw(*(Path(path).read_bytes() for path in descriptor_sets))
+        except OSError as e:
+            raise BatchError(f"entry {i}: {e}") from e
+    else:
+        raise BatchError(
+            f"entry {i} has generator {kind!r}, expected one of {', '.join(GENERATORS)}"
+        )
+
+    options: dict[str, object] = {}
+    for name in list(fields):
+        if name in _LIST_OPTIONS:
+            options[name] = _pop_list(i, fields, name)
+        elif name in _PATH_OPTIONS:
+            options[name] = Path(_pop_str(i, fields, name))
+        else:
+            value = fields.pop(name)
+            if name in _BOOL_OPTIONS:
+                valid = isinstance(value, bool)
+            elif name in _ENGINE_OPTIONS:
+                valid = value in ENGINES or (name == "verify_engine" and value is None)
+            else:
+                raise BatchError(f"entry {i} has unknown option {name!r}")
+            if not valid:
+                raise BatchError(
+                    f"entry {i} has an invalid value for {name!r}: {value!r}"
+                )
+            options[name] = value
+    return Entry(generator, python_out, options)
+
+
+def fix_batch_imports(
+    entries: Sequence[Entry],
+    *,
+    jobs: int | None = None,
+    timings: Timings | None = None,
+    cache: RewriteCache | None = None,
+    exclude_imports_glob: Sequence[str] = (),
+    **options: object,
+) -> None:
+    """Fix the imports of every entry of a manifest.
+
+    Parameters
+    ----------
+    entries
+        The entries of a manifest, as returned by :py:func:`load_manifest`
+    jobs
+        Number of entries to process at once, each in its own thread. Entries
+        are processed one after another if not given.
+    timings
+        If given, the time spent in each phase is added up across entries
+    cache
+        Cache shared by every entry. A new one is used if not given.
+    exclude_imports_glob
+        Exclude imports matching these glob patterns from being rewritten in
+        every entry, in addition to the patterns given by the entry
+    options
+        Keyword arguments of
+        :py:meth:`~protoletariat.fdsetgen.FileDescriptorSetGenerator.fix_imports`
+        used for every entry unless the entry overrides them
+    """
+    if cache is None:
+        cache = RewriteCache()
+
+    def merge_options(entry: Entry) -> dict[str, object]:
+        patterns = entry.options.get("exclude_imports_glob")
+        merged = {
+            **options,
+            **entry.options,
+            "exclude_imports_glob": [
+                *exclude_imports_glob,
+                *(patterns if isinstance(patterns, list) else ()),
+            ],
+        }
+        if merged.get("prune") and not merged.get("roots"):
+            raise BatchError(f"{entry.python_out}: 'prune' requires 'roots'")
+        return merged
+
+    # validate every entry before rewriting any of them
+    entry_options = list(map(merge_options, entries))
+
+    def fix_entry(entry: Entry, kwargs: dict[str, object]) -> Timings | None:
+        entry_timings = Timings() if timings is not None else None
+        try:
+            entry.generator.fix_imports(
+                python_out=entry.python_out,
+                **kwargs,  # type: ignore[arg-type]
+                cache=cache,
+                timings=entry_timings,
+            )
+        except Exception as e:
+            raise BatchError(f"{entry.python_out}: {type(e).__name__}: {e}") from e
+        return entry_timings
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs or 1) as pool:
+        for entry_timings in pool.map(fix_entry, entries, entry_options):
+            if timings is not None and entry_timings is not None:
+                for name, seconds in entry_timings.seconds.items():
+                    timings.add(
+                        name, seconds, detail=entry_timings.details.get(name, "")
+                    )
@@ -0,0 +1,174 @@
+"""A resident rewrite server and its client.
+
+The server listens on a Unix domain socket and keeps decoded descriptor sets
+and rewriters warm across requests. Clients still generate the
+`FileDescriptorSet` bytes themselves and ship them to the server along with
+the options that would otherwise be passed to
+:py:meth:`~protoletariat.fdsetgen.FileDescriptorSetGenerator.fix_imports`.
+
+Every message is a frame: an unsigned 64-bit big-endian length followed by
+that many bytes. A request is a JSON frame of options followed by a frame
+containing the descriptor set bytes. A response is a single JSON frame.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+import socketserver
+import struct
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, List, Union
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from .fdsetgen import FileDescriptorSetGenerator, RewriteCache
+
+    Options = Dict[str, Union[bool, int, str, List[str], None]]
+
+_HEADER = struct.Struct("!Q")
+
+# options whose values are paths and must be absolute when sent to the server
+_PATH_OPTIONS = frozenset({"python_out", "index", "store"})
+
+
+class DaemonError(Exception):
+    """Raised when the server fails to handle a request."""
+
+
+def _send_frame(sock: socket.socket, payload: bytes) -> None:
+    sock.sendall(_HEADER.pack(len(payload)))
+    sock.sendall(payload)
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(min(size - len(buf), 1 << 20))
+        if not chunk:
+            raise ConnectionError("connection closed before the frame was complete")
+        buf += chunk
+    return bytes(buf)
+
+
+def _recv_frame(sock: socket.socket) -> bytes:
+    (size,) = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    return _recv_exactly(sock, size)
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    server: Server
+
+    def handle(self) -> None:
+        options = json.loads(_recv_frame(self.request))
+        fdset_bytes = _recv_frame(self.request)
+        response: dict[str, str | list[list[str]]]
+        try:
+            outputs = self.server.fix_imports(fdset_bytes, options)
+        except Exception as e:  # noqa: BLE001
+            # report the failure to the client instead of killing the server
+            response = {"error": f"{type(e).__name__}: {e}"}
+        else:
+            response = {"outputs": outputs}
+        _send_frame(self.request, json.dumps(response).encode())
+
+
+class Server(socketserver.UnixStreamServer):
+    """Serve rewrite requests on the Unix domain socket at `socket_path`.
+
+    Requests are handled one at a time, so a single cache is shared by every
+    request without any locking.
+    """
+
+    def __init__(self, socket_path: Path) -> None:
+        self.socket_path = socket_path
+        _remove_stale_socket(socket_path)
+        super().__init__(os.fspath(socket_path), _RequestHandler)
+        # imported here so that clients don't import the rewriting machinery
+        from .fdsetgen import RewriteCache  # noqa: PLC0415
+
+        self.cache: RewriteCache = RewriteCache()
+
+    def fix_imports(self, fdset_bytes: bytes, options: Options) -> list[list[str]]:
+        """Rewrite imports and return the outputs the client must handle.
+
+        Files are written by the server when the request is in place,
+        otherwise their paths and new contents are sent back to the client.
+        """
+        outputs: list[list[str]] = []
+
+        def _collect(python_file: Path, code: str) -> None:
+            outputs.append([os.fspath(python_file), code])
+
+        from .fdsetgen import Raw  # noqa: PLC0415
+
+        in_place = options.pop("in_place")
+        kwargs = {
+            key: Path(value)  # type: ignore[arg-type]
+            if key in _PATH_OPTIONS and value is not None
+            else value
+            for key, value in options.items()
+        }
+        Raw(fdset_bytes).fix_imports(
+            **kwargs,  # type: ignore[arg-type]
+            overwrite_callback=_overwrite if in_place else _collect,
+            cache=self.cache,
+        )
+        return outputs
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.socket_path.unlink(missing_ok=True)
+
+
+def _overwrite(python_file: Path, code: str) -> None:
+    python_file.write_text(code)
+
+
+def _remove_stale_socket(socket_path: Path) -> None:
+    """Remove `socket_path` if it is left over from a server that died."""
+    if not socket_path.is_socket():
+        return
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(os.fspath(socket_path))
+        except ConnectionRefusedError:
+            socket_path.unlink()
+        else:
+            raise DaemonError(f"a server is already listening on {socket_path}")
+
+
+def fix_imports(
+    socket_path: Path,
+    generator: FileDescriptorSetGenerator,
+    *,
+    in_place: bool,
+    overwrite_callback: Callable[[Path, str], None],
+    python_out: Path,
+    **options: bool | int | str | Sequence[str] | Path | None,
+) -> None:
+    """Ask the server at `socket_path` to fix imports.
+
+    The descriptor set is generated locally by `generator`. Outputs returned
+    by the server are passed to `overwrite_callback`.
+    """
+    root = python_out.resolve()
+    payload = {
+        key: os.fspath(value.resolve()) if isinstance(value, Path) else value
+        for key, value in options.items()
+    }
+    payload.update(python_out=os.fspath(root), in_place=in_place)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(os.fspath(socket_path))
+        _send_frame(sock, json.dumps(payload).encode())
+        _send_frame(sock, generator.generate_file_descriptor_set_bytes())
+        response = json.loads(_recv_frame(sock))
+
+    if (error := response.get("error")) is not None:
+        raise DaemonError(error)
+
+    for path, code in response["outputs"]:
+        overwrite_callback(python_out.joinpath(Path(path).relative_to(root)), code)
@@ -1,54 +1,507 @@
 from __future__ import annotations
 
 import abc
+import ast
+import collections
+import concurrent.futures
+import contextlib
+import copy
 import fnmatch
+import functools
+import glob
+import hashlib
+import importlib.util
 import itertools
+import keyword
+import marshal
+import os
 import re
 import shlex
+import struct
 import subprocess
 import tempfile
-from pathlib import Path
-from typing import TYPE_CHECKING, Callable
+import threading
+import time
+import uuid
+import zipfile
+from pathlib import Path, PurePath, PurePosixPath
+from typing import TYPE_CHECKING, Callable, NamedTuple, TypeVar
 
-from google.protobuf.descriptor_pb2 import FileDescriptorSet
-
-from .rewrite import ASTImportRewriter, build_rewrites
+from .graph import DependencyGraph
+from .index import RewriteIndex
+from .locking import lock_directory
+from .packages import (
+    archive_prefix,
+    clean_proto_filename,
+    lazy_init_source,
+    pyi_init_source,
+)
+from .rewrite import (
+    ENGINES,
+    CrossValidatingRewriter,
+    build_reexport_rewrites,
+    build_rewrites,
+    contains_import,
+)
+from .store import OutputStore
+from .timings import Timings
 
+# protobuf is imported where descriptor sets are decoded or built, so that
+# clients of `protol serve`, which only generate descriptor set bytes, don't
+# pay for importing it
 if TYPE_CHECKING:
-    from collections.abc import Iterable, Sequence
+    from collections.abc import Iterable, Iterator, Mapping, Sequence
+
+    from google.protobuf.descriptor_pb2 import FileDescriptorProto, FileDescriptorSet
+
+    from .rewrite import ImportRewriter, Replacement
+
+_P = TypeVar("_P", bound=PurePath)
+
+_GLOB_MAGIC = re.compile(r"[*?[]")
+
+# the serialized FileDescriptorProto embedded in generated modules, passed to
+# `AddSerializedFile` by recent versions of protoc and to the
+# `serialized_pb` argument of `FileDescriptor` by older ones
+_SERIALIZED_FILE_PATTERN = re.compile(
+    r"""(?:AddSerializedFile\(|serialized_pb=)\s*(b'(?:[^'\\]|\\.)*'|b"(?:[^"\\]|\\.)*")"""
+)
+
+DEFAULT_MODULE_SUFFIXES = ("_pb2.py", "_pb2.pyi", "_pb2_grpc.py", "_pb2_grpc.pyi")
+
+EXECUTORS = ("thread", "process")
 
-_PROTO_SUFFIX_PATTERN = re.compile(r"^(.+)\.proto$")
 
+class _GlobMatcher:
+    """Match names against many glob patterns at once.
 
-def _clean_proto_filename(name: str) -> str:
-    """Remove the `.proto` suffix from `name`.
+    The patterns are compiled into a single regular expression and the
+    decision for each name is memoized, since the same names are checked
+    once per file and again once per import of that file. Patterns without
+    wildcards are looked up in a set instead, so long lists of file names
+    don't slow down matching.
 
     Examples
     --------
-    >>> _clean_proto_filename("a/b.proto")
-    'a/b'
-    >>> _clean_proto_filename("a/b-c.proto")
-    'a/b_c'
-    >>> _clean_proto_filename("a/b_c.proto")
-    'a/b_c'
+    >>> matcher = _GlobMatcher(["google/protobuf/*", "vendor/*"])
+    >>> matcher("google/protobuf/empty.proto")
+    True
+    >>> matcher("foo/bar")
+    False
+    >>> matcher.lookups, matcher.misses
+    (2, 2)
+    >>> matcher("foo/bar")
+    False
+    >>> matcher.lookups, matcher.misses
+    (3, 2)
+    >>> matcher = _GlobMatcher(["a/b.proto", "c/*.proto"])
+    >>> matcher("a/b.proto"), matcher("c/d.proto"), matcher("a/c.proto")
+    (True, True, False)
+    >>> sorted(matcher.literals)
+    ['a/b.proto']
+    >>> forked = matcher.fork()
+    >>> forked("a/c.proto"), forked.lookups, forked.misses
+    (False, 1, 0)
     """
-    return _PROTO_SUFFIX_PATTERN.sub(r"\1", name).replace("-", "_")
 
+    def __init__(self, patterns: Sequence[str]) -> None:
+        self.patterns = tuple(patterns)
+        self.literals = frozenset(
+            pattern for pattern in self.patterns if not _GLOB_MAGIC.search(pattern)
+        )
+        self.pattern = re.compile(
+            "|".join(
+                fnmatch.translate(pattern)
+                for pattern in self.patterns
+                if pattern not in self.literals
+            )
+            or r"(?!)"
+        )
+        self.decisions: dict[str, bool] = {}
+        self.lookups = 0
+        self.misses = 0
+        # time spent evaluating the pattern
+        self.seconds = 0.0
 
-def _should_ignore(fd_name: str, patterns: Sequence[str]) -> bool:
-    """Return whether `fd_name` should be ignored according to `patterns`.
+    def __call__(self, name: str) -> bool:
+        """Return whether `name` matches any of the patterns."""
+        self.lookups += 1
+        try:
+            return self.decisions[name]
+        except KeyError:
+            start = time.perf_counter()
+            result = self.decisions[name] = (
+                name in self.literals or self.pattern.match(name) is not None
+            )
+            self.misses += 1
+            self.seconds += time.perf_counter() - start
+            return result
+
+    def fork(self) -> _GlobMatcher:
+        """Return a matcher sharing the decisions of this one, counting anew.
+
+        Callers running concurrently each use their own fork, so that the
+        counters only reflect their own lookups.
+        """
+        matcher = copy.copy(self)
+        matcher.lookups = matcher.misses = 0
+        matcher.seconds = 0.0
+        return matcher
+
+
+class _Reexport(NamedTuple):
+    """The names re-exported from a public dependency."""
+
+    # names a star import of the dependency's module brings in
+    names: tuple[str, ...]
+    # names stubs import from the dependency's stub
+    stub_names: tuple[str, ...]
+
+
+def _stub_names(fd: FileDescriptorProto) -> list[str]:
+    """Compute the names that stubs of dependents re-export from `fd`.
+
+    These are the top-level messages, enums, enum values, extensions and, if
+    generic services are enabled, services.
 
     Examples
     --------
-    >>> fd_name = "google/protobuf/empty.proto"
-    >>> pattern = "google/protobuf/*"
-    >>> _should_ignore(fd_name, [pattern])
-    True
-    >>> fd_name = "foo/bar"
-    >>> _should_ignore(fd_name, [pattern])
-    False
+    >>> from google.protobuf.descriptor_pb2 import FileDescriptorProto
+    >>> fd = FileDescriptorProto(
+    ...     name="a.proto",
+    ...     message_type=[dict(name="A")],
+    ...     enum_type=[dict(name="Color", value=[dict(name="RED", number=0)])],
+    ...     extension=[dict(name="tag", number=100, extendee=".A")],
+    ... )
+    >>> _stub_names(fd)
+    ['A', 'Color', 'RED', 'tag']
+    """
+    names = [message.name for message in fd.message_type]
+    names.extend(enum.name for enum in fd.enum_type)
+    names.extend(value.name for enum in fd.enum_type for value in enum.value)
+    names.extend(extension.name for extension in fd.extension)
+    if fd.options.py_generic_services:
+        names.extend(service.name for service in fd.service)
+    return names
+
+
+def _module_names(fd: FileDescriptorProto) -> list[str]:
+    """Compute the public names defined by the module generated from `fd`.
+
+    Besides the names of :py:func:`_stub_names`, modules define the field
+    number of every extension and a stub class for every generic service.
+    ``DESCRIPTOR`` is left out since every module defines its own.
+
+    Examples
+    --------
+    >>> from google.protobuf.descriptor_pb2 import FileDescriptorProto
+    >>> fd = FileDescriptorProto(
+    ...     name="a.proto",
+    ...     message_type=[dict(name="A")],
+    ...     extension=[dict(name="tag", number=100, extendee=".A")],
+    ... )
+    >>> _module_names(fd)
+    ['A', 'tag', 'TAG_FIELD_NUMBER']
+    """
+    names = _stub_names(fd)
+    names.extend(f"{extension.name.upper()}_FIELD_NUMBER" for extension in fd.extension)
+    if fd.options.py_generic_services:
+        names.extend(f"{service.name}_Stub" for service in fd.service)
+    return names
+
+
+class _ReexportedNames:
+    """Compute the names modules re-export from their public dependencies.
+
+    A module generated from a file with public dependencies star imports
+    the module of each of them, which brings in the names that module
+    defines as well as those it star imports in turn.
+
+    Examples
+    --------
+    >>> from google.protobuf.descriptor_pb2 import FileDescriptorSet
+    >>> fdset = FileDescriptorSet(
+    ...     file=[
+    ...         dict(name="c.proto", message_type=[dict(name="C")]),
+    ...         dict(name="b.proto", dependency=["c.proto"], public_dependency=[0]),
+    ...         dict(name="a.proto", dependency=["b.proto"], public_dependency=[0]),
+    ...     ]
+    ... )
+    >>> reexported = _ReexportedNames(fdset)
+    >>> reexported(fdset.file[2])
+    {'b.proto': _Reexport(names=('C',), stub_names=())}
     """
-    return any(fnmatch.fnmatchcase(fd_name, pattern) for pattern in patterns)
+
+    def __init__(self, fdset: FileDescriptorSet) -> None:
+        self.files = {fd.name: fd for fd in fdset.file}
+        self.names: dict[str, tuple[str, ...] | None] = {}
+
+    def __call__(self, fd: FileDescriptorProto) -> dict[str, _Reexport]:
+        """Map each public dependency of `fd` to the names it re-exports.
+
+        Dependencies whose names are unknown, because their descriptors are
+        missing, or can't be imported explicitly, because one of them is a
+        Python keyword, are left out so their star imports are kept.
+        """
+        reexports = {}
+        for i in fd.public_dependency:
+            dep = fd.dependency[i]
+            names = self._names(dep)
+            if names:
+                reexports[dep] = _Reexport(names, tuple(_stub_names(self.files[dep])))
+        return reexports
+
+    def _names(self, name: str) -> tuple[str, ...] | None:
+        try:
+            return self.names[name]
+        except KeyError:
+            pass
+
+        result = None
+        fd = self.files.get(name)
+        if fd is not None:
+            # use a dictionary to preserve order while deduplicating
+            names = dict.fromkeys(_module_names(fd))
+            for i in fd.public_dependency:
+                dep_names = self._names(fd.dependency[i])
+                if dep_names is None:
+                    break
+                names.update(dict.fromkeys(dep_names))
+            else:
+                if not any(map(keyword.iskeyword, names)):
+                    result = tuple(names)
+        self.names[name] = result
+        return result
+
+
+def _build_rewriter(
+    fd: FileDescriptorProto,
+    should_ignore: Callable[[str], bool],
+    *,
+    engine: str,
+    verify_engine: str | None,
+    reexports: Mapping[str, _Reexport] | None = None,
+) -> ImportRewriter:
+    """Construct the import rewriter for the modules generated from `fd`."""
+    rewriter = ENGINES[engine]()
+    if verify_engine is not None:
+        rewriter = CrossValidatingRewriter(
+            rewriter, ENGINES[verify_engine](), name=fd.name
+        )
+    for repl in _replacements(fd, should_ignore, reexports=reexports):
+        rewriter.register_rewrite(repl)
+    return rewriter
+
+
+def _replacements(
+    fd: FileDescriptorProto,
+    should_ignore: Callable[[str], bool],
+    *,
+    reexports: Mapping[str, _Reexport] | None = None,
+) -> Iterator[Replacement]:
+    """Generate the rewrite rules of the modules generated from `fd`.
+
+    Public dependencies in `reexports` are re-exported explicitly, see
+    :py:func:`~protoletariat.rewrite.build_reexport_rewrites`.
+    """
+    fd_name = clean_proto_filename(fd.name)
+    # services live outside of the corresponding generated Python
+    # module, but they import it so we register a rewrite for the
+    # current proto as a dependency of itself to handle the case
+    # of services
+    yield from build_rewrites(fd_name, fd_name, is_public=False)
+
+    # register proto import rewrites
+
+    # construct a frozenset for dependencies to check whether need to
+    # rewrite using star imports
+    public_deps = frozenset(fd.public_dependency)
+
+    if reexports is None:
+        reexports = {}
+
+    for i, dep_file in enumerate(fd.dependency):
+        dep = clean_proto_filename(dep_file)
+        if should_ignore(dep):
+            continue
+
+        dep_name = clean_proto_filename(dep)
+        reexport = reexports.get(dep_file) if i in public_deps else None
+        yield from build_rewrites(
+            fd_name, dep_name, is_public=i in public_deps and reexport is None
+        )
+        if reexport is not None:
+            yield from build_reexport_rewrites(
+                fd_name,
+                dep_name,
+                names=reexport.names,
+                stub_names=reexport.stub_names,
+            )
+
+
+def _stale_imports(
+    fd: FileDescriptorProto,
+    should_ignore: Callable[[str], bool],
+    reexported: _ReexportedNames,
+    *,
+    explicit_reexports: bool,
+) -> frozenset[str]:
+    """Compute the import statements that make a module of `fd` out of date.
+
+    Those are the imports that its rewrite rules replace and, if `fd` has
+    public dependencies, the imports that rewriting with the other kind of
+    re-exports produces instead.
+    """
+    reexports = reexported(fd)
+    rules = list(
+        _replacements(
+            fd, should_ignore, reexports=reexports if explicit_reexports else None
+        )
+    )
+    imports = {repl.old for repl in rules}
+    if fd.public_dependency:
+        imports.update(
+            repl.new
+            for repl in _replacements(
+                fd, should_ignore, reexports=None if explicit_reexports else reexports
+            )
+        )
+        imports.difference_update(repl.new for repl in rules)
+    return frozenset(imports)
+
+
+class RewriteCache:
+    """Memoize decoded descriptor sets and the rewriters built from them.
+
+    Sharing a cache across calls to
+    :py:meth:`FileDescriptorSetGenerator.fix_imports` lets long-running
+    processes skip decoding and rule construction for inputs they have
+    already seen. Caches can be shared by threads.
+
+    Parameters
+    ----------
+    max_descriptor_sets
+        Maximum number of decoded descriptor sets to keep around. Rewriters
+        are small and are kept indefinitely.
+    """
+
+    def __init__(self, *, max_descriptor_sets: int = 64) -> None:
+        self.max_descriptor_sets = max_descriptor_sets
+        self.fdsets: collections.OrderedDict[bytes, FileDescriptorSet] = (
+            collections.OrderedDict()
+        )
+        self.rewriters: dict[
+            tuple[
+                str,
+                tuple[str, ...],
+                tuple[int, ...],
+                tuple[str, ...],
+                str,
+                str | None,
+                tuple[tuple[str, _Reexport], ...] | None,
+            ],
+            ImportRewriter,
+        ] = {}
+        self.matchers: dict[tuple[str, ...], _GlobMatcher] = {}
+        # guards the dictionaries, values are computed outside of it and the
+        # first one stored wins
+        self._lock = threading.Lock()
+
+    def file_descriptor_set(self, fdset_bytes: bytes) -> FileDescriptorSet:
+        """Decode `fdset_bytes`, reusing a previous decoding if possible."""
+        key = hashlib.sha256(fdset_bytes).digest()
+        with self._lock:
+            fdset = self.fdsets.get(key)
+            if fdset is not None:
+                self.fdsets.move_to_end(key)
+                return fdset
+
+        from google.protobuf.descriptor_pb2 import FileDescriptorSet  # noqa: PLC0415
+
+        fdset = FileDescriptorSet.FromString(fdset_bytes)
+        with self._lock:
+            fdset = self.fdsets.setdefault(key, fdset)
+            self.fdsets.move_to_end(key)
+            if len(self.fdsets) > self.max_descriptor_sets:
+                self.fdsets.popitem(last=False)
+        return fdset
+
+    def matcher(self, exclude_imports_glob: Sequence[str]) -> _GlobMatcher:
+        """Return the compiled matcher of `exclude_imports_glob`.
+
+        The matcher is shared, use a :py:meth:`~_GlobMatcher.fork` of it to
+        count lookups.
+        """
+        key = tuple(exclude_imports_glob)
+        with self._lock:
+            matcher = self.matchers.get(key)
+        if matcher is None:
+            matcher = _GlobMatcher(key)
+            with self._lock:
+                matcher = self.matchers.setdefault(key, matcher)
+        return matcher
+
+    def rewriter(
+        self,
+        fd: FileDescriptorProto,
+        exclude_imports_glob: Sequence[str],
+        *,
+        engine: str = "ast",
+        verify_engine: str | None = None,
+        reexports: Mapping[str, _Reexport] | None = None,
+        should_ignore: Callable[[str], bool] | None = None,
+    ) -> ImportRewriter:
+        """Return the rewriter for `fd`, constructing it if necessary.
+
+        Rewriters depend only on the name and dependencies of `fd`, the
+        exclusion patterns, the engines and the re-exported names, so that's
+        all we key on.
+
+        Parameters
+        ----------
+        fd
+            The descriptor of a proto file
+        exclude_imports_glob
+            Exclude imports matching these glob patterns from being rewritten
+        engine
+            Name of the rewrite engine, one of
+            :py:data:`~protoletariat.rewrite.ENGINES`
+        verify_engine
+            Name of an engine to check every rewrite of `engine` against, see
+            :py:class:`~protoletariat.rewrite.CrossValidatingRewriter`
+        reexports
+            Names to re-export explicitly from each public dependency of
+            `fd`, by the name of the dependency. Other public dependencies
+            are star imported.
+        should_ignore
+            Matcher of `exclude_imports_glob` to construct the rewriter with,
+            e.g., a fork of :py:meth:`matcher` counting the lookups of one
+            caller. Defaults to :py:meth:`matcher`.
+        """
+        key = (
+            fd.name,
+            tuple(fd.dependency),
+            tuple(fd.public_dependency),
+            tuple(exclude_imports_glob),
+            engine,
+            verify_engine,
+            None if reexports is None else tuple(sorted(reexports.items())),
+        )
+        with self._lock:
+            rewriter = self.rewriters.get(key)
+        if rewriter is None:
+            rewriter = _build_rewriter(
+                fd,
+                self.matcher(exclude_imports_glob)
+                if should_ignore is None
+                else should_ignore,
+                engine=engine,
+                verify_engine=verify_engine,
+                reexports=reexports,
+            )
+            with self._lock:
+                rewriter = self.rewriters.setdefault(key, rewriter)
+        return rewriter
 
 
 class FileDescriptorSetGenerator(abc.ABC):
@@ -66,77 +519,747 @@ class FileDescriptorSetGenerator(abc.ABC):
         overwrite_callback: Callable[[Path, str], None],
         module_suffixes: Sequence[str],
         exclude_imports_glob: Sequence[str],
+        cache: RewriteCache | None = None,
+        index: Path | None = None,
+        changed: Sequence[str] | None = None,
+        timings: Timings | None = None,
+        jobs: int | None = None,
+        executor: str = "thread",
+        engine: str = "ast",
+        verify_engine: str | None = None,
+        compile_bytecode: bool = False,
+        lazy_init: bool = False,
+        roots: Sequence[str] | None = None,
+        prune: bool = False,
+        store: Path | None = None,
+        store_link: str | None = None,
+        only: Sequence[str] | None = None,
+        explicit_reexports: bool = False,
     ) -> None:
-        """Fix imports from protoc/buf generated code."""
-        fdset = FileDescriptorSet.FromString(self.generate_file_descriptor_set_bytes())
+        """Fix imports from protoc/buf generated code.
 
-        has_pyi = any(suffix.endswith(".pyi") for suffix in module_suffixes)
-        for fd in fdset.file:
-            if _should_ignore(fd.name, exclude_imports_glob):
-                continue
+        Parameters
+        ----------
+        index
+            Path to a :py:class:`~protoletariat.index.RewriteIndex`. Proto
+            files whose imports and generated modules are unchanged since
+            they were last rewritten are skipped, and the index is updated
+            afterwards.
+        changed
+            Names of the proto files to process, e.g., ``"a/b.proto"``. All
+            other files are skipped. Shorthand for `only` patterns matching
+            exactly these names, which are processed along with the files
+            selected by `only`.
+        timings
+            Accumulates the time spent in each phase
+        jobs
+            Number of workers to rewrite modules with. Modules are rewritten
+            in the calling thread if `None`.
+        executor
+            One of :py:data:`EXECUTORS`. Threads avoid the cost of starting
+            processes and pickling rewriters, and rewrite in parallel on
+            free-threaded builds of Python.
+        engine
+            Name of the rewrite engine, one of
+            :py:data:`~protoletariat.rewrite.ENGINES`
+        verify_engine
+            Also rewrite every module with this engine and raise
+            :py:class:`~protoletariat.rewrite.EngineMismatchError` if the
+            results aren't equivalent
+        compile_bytecode
+            Compile every rewritten ``.py`` module from its new source and
+            write its ``.pyc`` to ``__pycache__``, using the workers given by
+            `jobs`. Only useful if `overwrite_callback` writes the module to
+            its path. Modules materialized from `store` are compiled too.
+        lazy_init
+            Make the `__init__.py` files created by `create_package` import
+            submodules on first access instead of leaving them empty
+        roots
+            Glob patterns of the proto files that are used directly. Only
+            the modules of these files and the files they transitively
+            import are processed.
+        prune
+            Delete the modules, and their cached bytecode, of the files that
+            aren't reachable from `roots`. Otherwise they're skipped. Imports
+            of deleted modules are removed from existing `__init__.pyi`
+            files.
+        store
+            Directory of a :py:class:`~protoletariat.store.OutputStore`
+            shared with other output trees. Files whose modules are all in
+            the store are materialized from it instead of being rewritten,
+            other files are rewritten and added to it. Rewritten modules are
+            materialized instead of being passed to `overwrite_callback`, so
+            this only makes sense if that writes the module to its path.
+        store_link
+            How modules are materialized from `store`, one of
+            :py:data:`~protoletariat.store.LINK_MODES`. Defaults to
+            copies.
+        only
+            Glob patterns of the proto files, e.g., ``"a/*.proto"``, or of
+            their modules relative to `python_out`, e.g., ``"a/b_pb2.py"``,
+            to process. All other files are skipped, unlike with
+            `exclude_imports_glob` the imports of processed files are still
+            rewritten. Patterns without wildcards are matched exactly and
+            cheaply, so long lists of files are fine.
+        explicit_reexports
+            Replace the star imports of public dependencies with imports of
+            the names they define, and make stubs re-export those names
+            explicitly, see
+            :py:func:`~protoletariat.rewrite.build_reexport_rewrites`
+        """
+        if cache is None:
+            cache = RewriteCache()
+
+        if timings is None:
+            timings = Timings()
+
+        if changed is not None:
+            only = (*(only or ()), *map(glob.escape, changed))
 
-            fd_name = _clean_proto_filename(fd.name)
-            rewriter = ASTImportRewriter()
-            # services live outside of the corresponding generated Python
-            # module, but they import it so we register a rewrite for the
-            # current proto as a dependency of itself to handle the case
-            # of services
-            for repl in build_rewrites(fd_name, fd_name, is_public=False):
-                rewriter.register_rewrite(repl)
+        with timings.phase("generate descriptor set"):
+            fdset_bytes = self.generate_file_descriptor_set_bytes()
+        with timings.phase("decode descriptor set"):
+            fdset = cache.file_descriptor_set(fdset_bytes)
 
-            # register proto import rewrites
+        rewrite_index = (
+            None
+            if index is None
+            else RewriteIndex(
+                index,
+                params=dict(
+                    module_suffixes=module_suffixes,
+                    exclude_imports_glob=exclude_imports_glob,
+                ),
+            )
+        )
+        reexported = _ReexportedNames(fdset) if explicit_reexports else None
+        is_only = None if only is None else _GlobMatcher(only)
+        packages: set[Path] = set()
 
-            # construct a frozenset for dependencies to check whether need to
-            # rewrite using star imports
-            public_deps = frozenset(fd.public_dependency)
+        output_store = (
+            None
+            if store is None
+            else OutputStore(
+                store,
+                params=dict(
+                    engine=engine,
+                    exclude_imports_glob=exclude_imports_glob,
+                    explicit_reexports=explicit_reexports,
+                ),
+                link=store_link or "copy",
+            )
+        )
+        # keys of the modules of each file to rewrite, and the stored modules
+        # of each file to materialize
+        store_keys: dict[str, dict[str, str]] = {}
+        stored: list[tuple[FileDescriptorProto, str, dict[str, Path]]] = []
 
-            for i, dep in enumerate(map(_clean_proto_filename, fd.dependency)):
-                if _should_ignore(dep, exclude_imports_glob):
+        # directories that modules were pruned from
+        pruned: set[Path] = set()
+        reachable = None
+        if roots is not None:
+            with timings.phase("compute reachability"):
+                is_root = _GlobMatcher(roots)
+                root_names = [fd.name for fd in fdset.file if is_root(fd.name)]
+                if not root_names:
+                    # most likely a typo, which would otherwise skip or, with
+                    # `prune`, delete every module
+                    raise UnmatchedRootsError(
+                        f"no file in the descriptor set matches roots {list(roots)}"
+                    )
+                reachable = DependencyGraph.from_file_descriptor_set(fdset).closure(
+                    root_names
+                )
+
+        with timings.phase("compile exclusions"):
+            # the cache may be shared with other threads, so count this
+            # call's lookups separately
+            should_ignore = cache.matcher(exclude_imports_glob).fork()
+
+        # select rewriters in this thread, only reading and rewriting modules
+        # happen in workers
+        selected: list[tuple[FileDescriptorProto, str]] = []
+        work: list[tuple[FileDescriptorProto, str, ImportRewriter, dict[str, str]]] = []
+        with timings.phase("select files"):
+            for fd in fdset.file:
+                if should_ignore(fd.name):
+                    continue
+
+                fd_name = clean_proto_filename(fd.name)
+                if is_only is not None and not (
+                    is_only(fd.name)
+                    or any(is_only(f"{fd_name}{suffix}") for suffix in module_suffixes)
+                ):
+                    continue
+
+                if reachable is not None and fd.name not in reachable:
+                    if prune:
+                        _remove_modules(python_out, fd_name, module_suffixes)
+                        pruned.add(python_out.joinpath(fd_name).parent)
                     continue
 
-                dep_name = _clean_proto_filename(dep)
-                for repl in build_rewrites(
-                    fd_name, dep_name, is_public=i in public_deps
+                selected.append((fd, fd_name))
+
+        with timings.phase("read modules"), concurrent.futures.ThreadPoolExecutor(
+            thread_name_prefix="protol-read"
+        ) as readers:
+            # read the modules of the selected files in the background while
+            # the ones already read are checked
+            all_sources = readers.map(
+                functools.partial(
+                    _read_modules, python_out, module_suffixes=module_suffixes
+                ),
+                [fd_name for _, fd_name in selected],
+            )
+            for (fd, fd_name), sources in zip(selected, all_sources):
+                if rewrite_index is not None and rewrite_index.is_current(fd, sources):
+                    continue
+
+                reexports = None if reexported is None else reexported(fd)
+                if output_store is not None:
+                    keys = {
+                        suffix: output_store.key(fd, source, reexports=reexports)
+                        for suffix, source in sources.items()
+                    }
+                    objs = {
+                        suffix: obj
+                        for suffix, key in keys.items()
+                        if (obj := output_store.get(key)) is not None
+                    }
+                    if len(objs) == len(keys):
+                        stored.append((fd, fd_name, objs))
+                        continue
+                    store_keys[fd.name] = keys
+
+                rewriter = cache.rewriter(
+                    fd,
+                    exclude_imports_glob,
+                    engine=engine,
+                    verify_engine=verify_engine,
+                    reexports=reexports,
+                    should_ignore=should_ignore,
+                )
+                work.append((fd, fd_name, rewriter, sources))
+
+        with timings.phase("rewrite"), _make_executor(jobs, executor) as pool:
+            results = (map if pool is None else pool.map)(
+                _rewrite_modules,
+                [rewriter for _, _, rewriter, _ in work],
+                [sources for *_, sources in work],
+                [
+                    {
+                        suffix: os.fspath(python_out.joinpath(f"{fd_name}{suffix}"))
+                        for suffix in sources
+                        if compile_bytecode and suffix.endswith(".py")
+                    }
+                    for _, fd_name, _, sources in work
+                ],
+            )
+            for (fd, fd_name, _, _), (outputs, bytecodes) in zip(work, results):
+                for suffix, new_code in outputs.items():
+                    python_file = python_out.joinpath(f"{fd_name}{suffix}")
+                    if output_store is None:
+                        overwrite_callback(python_file, new_code)
+                    else:
+                        output_store.materialize(
+                            output_store.put(store_keys[fd.name][suffix], new_code),
+                            python_file,
+                        )
+                    packages.add(python_file.parent)
+
+                    bytecode = bytecodes.get(suffix)
+                    if bytecode is not None:
+                        _write_bytecode(python_file, bytecode)
+
+                if rewrite_index is not None:
+                    rewrite_index.record(fd, outputs)
+
+        if stored:
+            with timings.phase("materialize stored modules"):
+                assert output_store is not None
+                for fd, fd_name, objs in stored:
+                    for suffix, obj in objs.items():
+                        python_file = python_out.joinpath(f"{fd_name}{suffix}")
+                        output_store.materialize(obj, python_file)
+                        packages.add(python_file.parent)
+                        if compile_bytecode and suffix.endswith(".py"):
+                            _write_bytecode(
+                                python_file,
+                                _compile(python_file.read_text(), python_file),
+                            )
+                    if rewrite_index is not None:
+                        rewrite_index.record(
+                            fd,
+                            {suffix: obj.read_text() for suffix, obj in objs.items()},
+                        )
+
+        # included in the other phases
+        timings.add(
+            "exclusion matching",
+            should_ignore.seconds,
+            detail=(
+                f"{len(should_ignore.patterns)} patterns, "
+                f"{should_ignore.lookups} lookups, "
+                f"{should_ignore.misses} evaluated"
+            ),
+        )
+
+        if rewrite_index is not None:
+            with timings.phase("save index"):
+                rewrite_index.save(DependencyGraph.from_file_descriptor_set(fdset))
+
+        if create_package:
+            # refresh the `__init__` files that import pruned modules
+            packages.update(pruned)
+        elif pruned and any(suffix.endswith(".pyi") for suffix in module_suffixes):
+            with timings.phase("prune package stubs"):
+                for package in pruned:
+                    if package.joinpath("__init__.pyi").exists():
+                        with lock_directory(package):
+                            _create_pyi_init(package)
+
+        if create_package:
+            with timings.phase("create package"):
+                if all(
+                    option is None for option in (rewrite_index, reachable, is_only)
                 ):
-                    rewriter.register_rewrite(repl)
+                    _create_package(python_out, module_suffixes, lazy_init=lazy_init)
+                else:
+                    _create_package(
+                        python_out,
+                        module_suffixes,
+                        packages=packages,
+                        lazy_init=lazy_init,
+                    )
+
+    def check_imports(
+        self,
+        *,
+        python_out: Path,
+        module_suffixes: Sequence[str],
+        exclude_imports_glob: Sequence[str],
+        cache: RewriteCache | None = None,
+        find_all: bool = False,
+        explicit_reexports: bool = False,
+    ) -> list[Path]:
+        """Find generated modules whose imports haven't been rewritten.
 
+        Nothing is written. Instead of rewriting each module, its import
+        lines are looked up in the imports that the rewrite rules replace,
+        which is much cheaper than rewriting and doesn't depend on the engine
+        the modules were rewritten with.
+
+        Parameters
+        ----------
+        python_out
+            Directory containing generated code
+        module_suffixes
+            Suffixes of Python/mypy modules to process
+        exclude_imports_glob
+            Exclude imports matching these glob patterns from being rewritten
+        cache
+            Cache of decoded descriptor sets and exclusion matchers
+        find_all
+            Find every out-of-date module instead of stopping at the first
+        explicit_reexports
+            Whether modules are expected to import the names of public
+            dependencies explicitly, as rewritten by :py:meth:`fix_imports`
+            with the same option. Modules rewritten the other way are out of
+            date too.
+
+        Returns
+        -------
+        list[Path]
+            The out-of-date modules, in descriptor set order
+        """
+        if cache is None:
+            cache = RewriteCache()
+
+        fdset = cache.file_descriptor_set(self.generate_file_descriptor_set_bytes())
+        should_ignore = cache.matcher(exclude_imports_glob)
+        reexported = _ReexportedNames(fdset)
+        stale = []
+        for fd in fdset.file:
+            if should_ignore(fd.name):
+                continue
+
+            fd_name = clean_proto_filename(fd.name)
+            old_imports = None
             for suffix in module_suffixes:
                 python_file = python_out.joinpath(f"{fd_name}{suffix}")
                 try:
-                    raw_code = python_file.read_text()
+                    source = python_file.read_text()
                 except FileNotFoundError:
-                    pass
-                else:
-                    new_code = rewriter.rewrite(raw_code)
-                    overwrite_callback(python_file, new_code)
+                    continue
 
-        if create_package:
-            # recursively create packages
-            for dir_entry in itertools.chain([python_out], python_out.rglob("*")):
-                if dir_entry.is_dir() and "__pycache__" not in dir_entry.parts:
+                if old_imports is None:
+                    old_imports = _stale_imports(
+                        fd,
+                        should_ignore,
+                        reexported,
+                        explicit_reexports=explicit_reexports,
+                    )
+                if contains_import(source, old_imports):
+                    stale.append(python_file)
+                    if not find_all:
+                        return stale
+        return stale
+
+    def rewrite_sources(
+        self,
+        sources: Mapping[str, str],
+        *,
+        module_suffixes: Sequence[str] = DEFAULT_MODULE_SUFFIXES,
+        exclude_imports_glob: Sequence[str] = ("google/protobuf/*",),
+        cache: RewriteCache | None = None,
+        engine: str = "ast",
+        verify_engine: str | None = None,
+        explicit_reexports: bool = False,
+    ) -> dict[str, str]:
+        """Fix imports of generated code held in memory.
+
+        Parameters
+        ----------
+        sources
+            Mapping of module path to module source code. Paths are
+            ``/``-separated and relative to the root of the generated code,
+            e.g., ``"a/b_pb2.py"``.
+        module_suffixes
+            Suffixes of Python/mypy modules to process
+        exclude_imports_glob
+            Exclude imports matching these glob patterns from being rewritten
+        cache
+            Cache of decoded descriptor sets and rewriters
+        engine
+            Name of the rewrite engine
+        verify_engine
+            Name of an engine to check every rewrite against
+        explicit_reexports
+            Re-export the names of public dependencies explicitly instead of
+            with star imports
+
+        Returns
+        -------
+        dict[str, str]
+            Mapping of module path to rewritten source code. Paths in
+            `sources` that aren't generated from the descriptor set are
+            omitted.
+        """
+        if cache is None:
+            cache = RewriteCache()
+
+        fdset = cache.file_descriptor_set(self.generate_file_descriptor_set_bytes())
+
+        rewritten = {}
+        for python_file, rewriter in _iter_modules(
+            fdset,
+            python_out=PurePosixPath(),
+            module_suffixes=module_suffixes,
+            exclude_imports_glob=exclude_imports_glob,
+            cache=cache,
+            engine=engine,
+            verify_engine=verify_engine,
+            explicit_reexports=explicit_reexports,
+        ):
+            key = str(python_file)
+            try:
+                raw_code = sources[key]
+            except KeyError:
+                pass
+            else:
+                rewritten[key] = rewriter.rewrite(raw_code)
+        return rewritten
+
+    def watch(
+        self,
+        *,
+        python_out: Path,
+        create_package: bool,
+        overwrite_callback: Callable[[Path, str], None],
+        module_suffixes: Sequence[str],
+        exclude_imports_glob: Sequence[str],
+        cache: RewriteCache | None = None,
+        poll_interval: float = 1.0,
+        max_passes: int | None = None,
+        engine: str = "ast",
+        verify_engine: str | None = None,
+        lazy_init: bool = False,
+        explicit_reexports: bool = False,
+    ) -> None:
+        """Fix imports, then keep fixing imports of modules as they change.
+
+        The descriptor set is generated once and its rewriters are reused for
+        every pass. Each pass polls the generated modules under `python_out`
+        and only rewrites the ones whose size, modification time or inode
+        changed since the previous pass.
+
+        Parameters
+        ----------
+        poll_interval
+            Number of seconds to sleep between passes
+        max_passes
+            Stop after this many passes. Watch forever if `None`.
+        """
+        if cache is None:
+            cache = RewriteCache()
+
+        fdset = cache.file_descriptor_set(self.generate_file_descriptor_set_bytes())
+        modules = dict(
+            _iter_modules(
+                fdset,
+                python_out=python_out,
+                module_suffixes=module_suffixes,
+                exclude_imports_glob=exclude_imports_glob,
+                cache=cache,
+                engine=engine,
+                verify_engine=verify_engine,
+                explicit_reexports=explicit_reexports,
+            )
+        )
+        stats: dict[Path, tuple[int, int, int]] = {}
+
+        for npasses in itertools.count(1):
+            rewritten = False
+            for python_file, rewriter in modules.items():
+                try:
+                    stat = _stat_key(python_file)
+                except FileNotFoundError:
+                    stats.pop(python_file, None)
+                    continue
+
+                if stats.get(python_file) == stat:
+                    continue
+
+                new_code = rewriter.rewrite(python_file.read_text())
+                overwrite_callback(python_file, new_code)
+                # record the state after the callback so that our own writes
+                # don't trigger another rewrite
+                stats[python_file] = _stat_key(python_file)
+                rewritten = True
+
+            if rewritten and create_package:
+                _create_package(python_out, module_suffixes, lazy_init=lazy_init)
+
+            if max_passes is not None and npasses >= max_passes:
+                break
+
+            time.sleep(poll_interval)
+
+
+def _iter_modules(
+    fdset: FileDescriptorSet,
+    *,
+    python_out: _P,
+    module_suffixes: Sequence[str],
+    exclude_imports_glob: Sequence[str],
+    cache: RewriteCache,
+    engine: str,
+    verify_engine: str | None,
+    explicit_reexports: bool,
+) -> Iterator[tuple[_P, ImportRewriter]]:
+    """Yield every module path that may be generated from `fdset`.
+
+    Each path is paired with the rewriter for its file descriptor. Paths are
+    not checked for existence.
+    """
+    should_ignore = cache.matcher(exclude_imports_glob)
+    reexported = _ReexportedNames(fdset) if explicit_reexports else None
+    for fd in fdset.file:
+        if should_ignore(fd.name):
+            continue
+
+        fd_name = clean_proto_filename(fd.name)
+        rewriter = cache.rewriter(
+            fd,
+            exclude_imports_glob,
+            engine=engine,
+            verify_engine=verify_engine,
+            reexports=None if reexported is None else reexported(fd),
+        )
+
+        for suffix in module_suffixes:
+            yield python_out.joinpath(f"{fd_name}{suffix}"), rewriter
+
+
+def _make_executor(
+    jobs: int | None, executor: str
+) -> contextlib.AbstractContextManager[concurrent.futures.Executor | None]:
+    if executor not in EXECUTORS:
+        raise ValueError(f"unsupported executor: {executor!r}")
+    if jobs is None:
+        return contextlib.nullcontext()
+    if executor == "thread":
+        return concurrent.futures.ThreadPoolExecutor(max_workers=jobs)
+    return concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+
+
+def _rewrite_modules(
+    rewriter: ImportRewriter,
+    sources: Mapping[str, str],
+    filenames: Mapping[str, str],
+) -> tuple[dict[str, str], dict[str, bytes]]:
+    """Rewrite `sources`, the modules generated from one proto file.
+
+    The rewritten modules whose suffix is in `filenames` are compiled as
+    that file. Their marshalled code objects are returned along with the
+    rewritten sources.
+    """
+    outputs = {suffix: rewriter.rewrite(code) for suffix, code in sources.items()}
+    bytecodes = {
+        suffix: _compile(outputs[suffix], filename)
+        for suffix, filename in filenames.items()
+    }
+    return outputs, bytecodes
+
+
+def _compile(source: str, filename: str | os.PathLike[str]) -> bytes:
+    """Compile the module `source` as `filename` and marshal its code."""
+    return marshal.dumps(compile(source, filename, "exec", dont_inherit=True))
+
+
+def _write_bytecode(python_file: Path, bytecode: bytes) -> None:
+    """Write the cached bytecode of `python_file`.
+
+    The header records the modification time and size of `python_file` as
+    it is now, so the file must already contain the source that `bytecode`
+    was compiled from.
+
+    Parameters
+    ----------
+    python_file
+        Path to the source of the module
+    bytecode
+        Marshalled code object of the module
+    """
+    st = python_file.stat()
+    # PEP 552 header of a timestamp-based pyc: magic number, flags, source
+    # modification time and source size
+    header = importlib.util.MAGIC_NUMBER + struct.pack(
+        "<III", 0, int(st.st_mtime) & 0xFFFFFFFF, st.st_size & 0xFFFFFFFF
+    )
+    pyc = Path(importlib.util.cache_from_source(os.fspath(python_file)))
+    pyc.parent.mkdir(exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=pyc.parent, prefix=f".{pyc.name}")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(bytecode)
+        # readable by whoever can read the source, like the caches written by
+        # the import system, rather than mkstemp's owner-only mode
+        os.chmod(tmp, (st.st_mode | 0o200) & 0o666)
+        os.replace(tmp, pyc)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _read_modules(
+    python_out: Path, fd_name: str, module_suffixes: Sequence[str]
+) -> dict[str, str]:
+    """Read the existing modules generated for `fd_name`, keyed by suffix."""
+    sources = {}
+    for suffix in module_suffixes:
+        python_file = python_out.joinpath(f"{fd_name}{suffix}")
+        with contextlib.suppress(FileNotFoundError):
+            sources[suffix] = python_file.read_text()
+    return sources
+
+
+def _remove_modules(
+    python_out: Path, fd_name: str, module_suffixes: Sequence[str]
+) -> None:
+    """Delete the modules generated for `fd_name` and their cached bytecode."""
+    for suffix in module_suffixes:
+        python_file = python_out.joinpath(f"{fd_name}{suffix}")
+        python_file.unlink(missing_ok=True)
+        if suffix.endswith(".py"):
+            Path(importlib.util.cache_from_source(os.fspath(python_file))).unlink(
+                missing_ok=True
+            )
+
+
+def _stat_key(path: Path) -> tuple[int, int, int]:
+    st = path.stat()
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def _create_package(
+    python_out: Path,
+    module_suffixes: Sequence[str],
+    *,
+    packages: Iterable[Path] | None = None,
+    lazy_init: bool = False,
+) -> None:
+    """Recursively create packages under `python_out`.
+
+    If `packages` is given, only those directories and their ancestors up to
+    `python_out` are turned into packages. If `lazy_init` is `True`, the
+    `__init__.py` files import submodules on first access, see
+    :py:func:`_lazy_init_source`.
+    """
+    has_pyi = any(suffix.endswith(".pyi") for suffix in module_suffixes)
+    if packages is None:
+        dir_entries: Iterable[Path] = itertools.chain(
+            [python_out], python_out.rglob("*")
+        )
+    else:
+        dir_entries = {
+            parent
+            for package in packages
+            for parent in (package, *package.parents)
+            if parent == python_out or python_out in parent.parents
+        }
+    for dir_entry in dir_entries:
+        if dir_entry.is_dir() and "__pycache__" not in dir_entry.parts:
+            # other processes may be updating the same package, see
+            # :py:mod:`protoletariat.locking`
+            with lock_directory(dir_entry):
+                if lazy_init:
+                    _create_lazy_init(dir_entry)
+                else:
                     dir_entry.joinpath("__init__.py").touch(exist_ok=True)
-                    if has_pyi:
-                        _create_pyi_init(dir_entry)
+                if has_pyi:
+                    _create_pyi_init(dir_entry)
+
+
+def _write_text_atomically(path: Path, text: str) -> None:
+    """Replace `path` with `text`, so readers never see a partial file."""
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+    try:
+        with tmp.open(mode="x") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
 
 
 def _create_pyi_init(root: Path) -> None:
-    # use a dictionary to preserve order while deduplicating
-    lines_to_write = {
-        f"from . import {path.stem}\n": None
-        for path in sorted(root.glob("*"))
-        if path.stem not in ("__init__", "__pycache__")
-        if path.suffix == ".pyi" or path.is_dir()
-    }
     path = root.joinpath("__init__.pyi")
+    try:
+        existing = path.read_text()
+    except FileNotFoundError:
+        existing = ""
+    source = pyi_init_source(
+        existing, ((path, path.is_dir()) for path in root.glob("*"))
+    )
+    if source is not None:
+        _write_text_atomically(path, source)
+    elif not path.exists():
+        path.touch()
 
-    if not path.exists():
-        path.write_text("".join(lines_to_write))
-    else:
-        with path.open(mode="r") as f:
-            for line in f:
-                lines_to_write.pop(line, None)
-        with path.open(mode="a") as f:
-            f.writelines(lines_to_write)
+
+def _create_lazy_init(root: Path) -> None:
+    path = root.joinpath("__init__.py")
+    try:
+        existing = path.read_text()
+    except FileNotFoundError:
+        existing = ""
+    source = lazy_init_source(
+        existing, ((path, path.is_dir()) for path in root.glob("*"))
+    )
+    if source is not None and source != existing:
+        _write_text_atomically(path, source)
 
 
 class Protoc(FileDescriptorSetGenerator):
@@ -148,10 +1271,28 @@ class Protoc(FileDescriptorSetGenerator):
         protoc_path: str,
         proto_paths: Iterable[Path],
         protoc_args: Iterable[str],
+        descriptor_sets_in: Sequence[Path] = (),
     ) -> None:
+        """Construct a `protoc`-based `FileDescriptorSetGenerator`.
+
+        Parameters
+        ----------
+        protoc_path
+            Path to protoc executable, possibly with leading arguments
+        proto_paths
+            Protobuf file search paths
+        protoc_args
+            Additional arguments to protoc, usually the files to compile
+        descriptor_sets_in
+            Prebuilt descriptor sets, for example of vendored dependencies.
+            protoc takes any imported files found in these sets from the sets
+            instead of parsing them, and copies them into the output because
+            of ``--include_imports``.
+        """
         self.protoc_path = protoc_path
         self.proto_paths = proto_paths
         self.protoc_args = protoc_args
+        self.descriptor_sets_in = descriptor_sets_in
 
     def generate_file_descriptor_set_bytes(self) -> bytes:
         with tempfile.NamedTemporaryFile(delete=False) as f:
@@ -161,8 +1302,13 @@ class Protoc(FileDescriptorSetGenerator):
                 "--include_imports",
                 f"--descriptor_set_out={filename}",
                 *map("--proto_path={}".format, self.proto_paths),
-                *self.protoc_args,
             ]
+            if self.descriptor_sets_in:
+                args.append(
+                    "--descriptor_set_in="
+                    + os.pathsep.join(map(os.fspath, self.descriptor_sets_in))
+                )
+            args.extend(self.protoc_args)
             subprocess.run(args, check=True)  # noqa: S603
 
         try:
@@ -201,10 +1347,107 @@ class Buf(FileDescriptorSetGenerator):
 
 
 class Raw(FileDescriptorSetGenerator):
-    """Generate the FileDescriptorSet using user-provided bytes."""
+    """Generate the FileDescriptorSet using user-provided bytes.
+
+    Several descriptor sets, for example one per build target, are merged
+    with :py:func:`merge_file_descriptor_sets`.
+    """
+
+    def __init__(self, *fdset_bytes: bytes) -> None:
+        self.descriptor_sets = fdset_bytes
+
+    def generate_file_descriptor_set_bytes(self) -> bytes:
+        if len(self.descriptor_sets) == 1:
+            return self.descriptor_sets[0]
+        return merge_file_descriptor_sets(self.descriptor_sets)
+
+
+class UnmatchedRootsError(Exception):
+    """Raised when none of the root patterns match a file."""
+
+
+class DescriptorSetConflictError(Exception):
+    """Raised when merged descriptor sets disagree about the same file."""
+
+
+def merge_file_descriptor_sets(descriptor_sets: Iterable[bytes]) -> bytes:
+    """Merge serialized descriptor sets into one containing each file once.
+
+    Files are deduplicated by name and kept in the order they're first seen,
+    so dependencies still precede the files that import them.
+
+    Raises
+    ------
+    DescriptorSetConflictError
+        If two sets contain different descriptors of a file with the same name
+    """
+    from google.protobuf.descriptor_pb2 import FileDescriptorSet  # noqa: PLC0415
+
+    merged = FileDescriptorSet()
+    # map each file name to the digest of its descriptor and the first set
+    # containing it
+    seen: dict[str, tuple[bytes, int]] = {}
+    for i, fdset_bytes in enumerate(descriptor_sets):
+        for fd in FileDescriptorSet.FromString(fdset_bytes).file:
+            digest = hashlib.sha256(fd.SerializeToString(deterministic=True)).digest()
+            try:
+                first_digest, first = seen[fd.name]
+            except KeyError:
+                seen[fd.name] = digest, i
+                merged.file.append(fd)
+            else:
+                if digest != first_digest:
+                    raise DescriptorSetConflictError(
+                        f"descriptor sets {first} and {i} contain different "
+                        f"descriptors of {fd.name}"
+                    )
+    return merged.SerializeToString()
+
+
+class Scan(FileDescriptorSetGenerator):
+    """Generate the FileDescriptorSet from already-generated Python modules.
+
+    Every module generated by protoc embeds its own serialized
+    `FileDescriptorProto`. Collecting them requires neither a compiler nor
+    the original proto files.
+    """
+
+    def __init__(
+        self, *, python_out: Path, archive_root: str = "", suffix: str = "_pb2.py"
+    ) -> None:
+        """Construct a `FileDescriptorSetGenerator` that scans generated code.
 
-    def __init__(self, fdset_bytes: bytes) -> None:
-        self.fdset_bytes = fdset_bytes
+        Parameters
+        ----------
+        python_out
+            Directory, zip archive or wheel containing generated modules
+        archive_root
+            Directory inside `python_out` containing the generated code, if
+            `python_out` is an archive
+        suffix
+            Suffix of the modules containing serialized descriptors
+        """
+        self.python_out = python_out
+        self.archive_root = archive_root
+        self.suffix = suffix
+
+    def _sources(self) -> Iterator[str]:
+        if self.python_out.is_dir():
+            for path in sorted(self.python_out.rglob(f"*{self.suffix}")):
+                yield path.read_text()
+        else:
+            prefix = archive_prefix(self.archive_root)
+            with zipfile.ZipFile(self.python_out) as zf:
+                for name in sorted(zf.namelist()):
+                    if name.startswith(prefix) and name.endswith(self.suffix):
+                        yield zf.read(name).decode()
 
     def generate_file_descriptor_set_bytes(self) -> bytes:
-        return self.fdset_bytes
+        from google.protobuf.descriptor_pb2 import FileDescriptorSet  # noqa: PLC0415
+
+        fdset = FileDescriptorSet()
+        for source in self._sources():
+            match = _SERIALIZED_FILE_PATTERN.search(source)
+            if match is not None:
+                fdset.file.add().MergeFromString(ast.literal_eval(match.group(1)))
+        return fdset.SerializeToString()
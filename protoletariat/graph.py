@@ -0,0 +1,343 @@
+"""The import graph of the files in a `FileDescriptorSet`."""
+
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING, NamedTuple
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator, Mapping
+
+    from google.protobuf.descriptor_pb2 import FileDescriptorSet
+
+
+class DependencyGraph:
+    """Dependencies and reverse dependencies of proto files.
+
+    Parameters
+    ----------
+    deps
+        Mapping of proto file name to the names of the files it imports
+
+    Examples
+    --------
+    >>> graph = DependencyGraph({"a.proto": ["b.proto"], "b.proto": []})
+    >>> graph.rdeps["b.proto"]
+    ('a.proto',)
+    """
+
+    def __init__(self, deps: Mapping[str, Iterable[str]]) -> None:
+        self.deps: dict[str, tuple[str, ...]] = {
+            name: tuple(file_deps) for name, file_deps in deps.items()
+        }
+        rdeps: dict[str, list[str]] = {name: [] for name in self.deps}
+        for name, file_deps in self.deps.items():
+            for dep in file_deps:
+                rdeps.setdefault(dep, []).append(name)
+        self.rdeps: dict[str, tuple[str, ...]] = {
+            name: tuple(sorted(names)) for name, names in rdeps.items()
+        }
+
+    @classmethod
+    def from_file_descriptor_set(cls, fdset: FileDescriptorSet) -> DependencyGraph:
+        return cls({fd.name: fd.dependency for fd in fdset.file})
+
+    def heaviest_chains(
+        self, weights: Mapping[str, float]
+    ) -> dict[str, tuple[float, tuple[str, ...]]]:
+        """Find the import chain with the largest total weight from each file.
+
+        Parameters
+        ----------
+        weights
+            Mapping of proto file name to its weight. Missing files weigh
+            nothing.
+
+        Returns
+        -------
+        dict[str, tuple[float, tuple[str, ...]]]
+            Mapping of proto file name to the total weight and the files of
+            the heaviest chain of imports starting at that file. Imports that
+            would close a cycle are ignored.
+
+        Examples
+        --------
+        >>> graph = DependencyGraph({"a": ["b", "c"], "b": ["c"], "c": []})
+        >>> graph.heaviest_chains({"a": 1, "b": 1, "c": 1})["a"]
+        (3, ('a', 'b', 'c'))
+        >>> graph.heaviest_chains({"a": 1, "b": 1, "c": 5})["a"]
+        (7, ('a', 'b', 'c'))
+        """
+        # depth-first without recursion so that deep import chains don't
+        # exhaust the stack
+        chains: dict[str, tuple[float, tuple[str, ...]]] = {}
+        # the heaviest chain found so far from the imports of each file being
+        # visited, i.e., of the files on the current path
+        heaviest: dict[str, tuple[float, tuple[str, ...]] | None] = {}
+
+        def push(name: str) -> None:
+            heaviest[name] = None
+            work.append((name, iter(self.deps.get(name, ()))))
+
+        def offer(name: str, candidate: tuple[float, tuple[str, ...]]) -> None:
+            current = heaviest[name]
+            if current is None or candidate[0] > current[0]:
+                heaviest[name] = candidate
+
+        for root in self.deps:
+            if root in chains:
+                continue
+            work: list[tuple[str, Iterator[str]]] = []
+            push(root)
+            while work:
+                name, deps = work[-1]
+                for dep in deps:
+                    # skip imports that would close a cycle
+                    if dep in heaviest:
+                        continue
+                    if dep not in chains:
+                        push(dep)
+                        break
+                    offer(name, chains[dep])
+                else:
+                    work.pop()
+                    weight, chain = heaviest.pop(name) or (0, ())
+                    chains[name] = (weights.get(name, 0) + weight, (name, *chain))
+                    if work:
+                        offer(work[-1][0], chains[name])
+        return chains
+
+    def closure(self, names: Iterable[str]) -> set[str]:
+        """Compute the files transitively imported by `names`, and `names`.
+
+        Examples
+        --------
+        >>> graph = DependencyGraph({"a": ["b"], "b": ["c"], "c": [], "d": ["a"]})
+        >>> sorted(graph.closure(["a"]))
+        ['a', 'b', 'c']
+        """
+        stack = list(names)
+        reachable = set(stack)
+        while stack:
+            for dep in self.deps.get(stack.pop(), ()):
+                if dep not in reachable:
+                    reachable.add(dep)
+                    stack.append(dep)
+        return reachable
+
+    def _components(self) -> Iterator[list[str]]:
+        """Generate the strongly connected components of the graph.
+
+        Components are generated after every component they import, which
+        is the order Tarjan's algorithm finds them in.
+        """
+        # Tarjan's algorithm, without recursion so that deep import chains
+        # don't exhaust the stack
+        index: dict[str, int] = {}
+        lowlink: dict[str, int] = {}
+        stack: list[str] = []
+        on_stack: set[str] = set()
+
+        def push(name: str) -> None:
+            index[name] = lowlink[name] = len(index)
+            stack.append(name)
+            on_stack.add(name)
+            work.append((name, iter(self.deps.get(name, ()))))
+
+        for root in self.deps:
+            if root in index:
+                continue
+            work: list[tuple[str, Iterator[str]]] = []
+            push(root)
+            while work:
+                name, deps = work[-1]
+                for dep in deps:
+                    if dep not in index:
+                        push(dep)
+                        break
+                    if dep in on_stack:
+                        lowlink[name] = min(lowlink[name], index[dep])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[name])
+                    if lowlink[name] == index[name]:
+                        component = []
+                        while (member := stack.pop()) != name:
+                            on_stack.discard(member)
+                            component.append(member)
+                        on_stack.discard(name)
+                        component.append(name)
+                        yield component
+
+    def cycles(self) -> list[tuple[str, ...]]:
+        """Find the groups of files that import each other, directly or not.
+
+        Returns
+        -------
+        list[tuple[str, ...]]
+            The sorted names of the files of each import cycle
+
+        Examples
+        --------
+        >>> graph = DependencyGraph(
+        ...     {"a": ["b"], "b": ["c"], "c": ["a"], "d": ["d"], "e": ["a"]}
+        ... )
+        >>> graph.cycles()
+        [('a', 'b', 'c'), ('d',)]
+        """
+        return sorted(
+            tuple(sorted(component))
+            for component in self._components()
+            if len(component) > 1 or component[0] in self.deps.get(component[0], ())
+        )
+
+    def closure_sizes(self) -> dict[str, int]:
+        """Count the files transitively imported by each file.
+
+        Equivalent to the size of each file's :py:meth:`closure` without the
+        file itself, but computed in one traversal of the graph rather than
+        one per file: files in a strongly connected component import the
+        same files, and the closure of a component is the union of those of
+        the components it imports, which are found first. Closures are kept
+        as integers with one bit per file.
+
+        Examples
+        --------
+        >>> graph = DependencyGraph({"a": ["b"], "b": ["c", "a"], "c": [], "d": ["a"]})
+        >>> graph.closure_sizes()
+        {'a': 2, 'b': 2, 'c': 0, 'd': 3}
+        """
+        component_of: dict[str, int] = {}
+        closures: list[int] = []
+        for component in self._components():
+            i = len(closures)
+            closure = 0
+            for name in component:
+                closure |= 1 << len(component_of)
+                component_of[name] = i
+            for name in component:
+                for dep in self.deps.get(name, ()):
+                    if component_of[dep] != i:
+                        closure |= closures[component_of[dep]]
+            closures.append(closure)
+        return {
+            name: bin(closures[component_of[name]]).count("1") - 1 for name in self.deps
+        }
+
+
+class GraphReport(NamedTuple):
+    """Structural hotspots of a :py:class:`DependencyGraph`.
+
+    Attributes
+    ----------
+    cycles
+        Groups of files that import each other
+    fan_in
+        Files imported by the most files, with the number of importers
+    fan_out
+        Files importing the most files, with the number of imports
+    chains
+        The longest import chains
+    closure_sizes
+        Number of files transitively imported by each file
+    """
+
+    cycles: list[tuple[str, ...]]
+    fan_in: list[tuple[str, int]]
+    fan_out: list[tuple[str, int]]
+    chains: list[tuple[str, ...]]
+    closure_sizes: dict[str, int]
+
+
+def analyze(graph: DependencyGraph, *, top: int) -> GraphReport:
+    """Find the cycles and the `top` hotspots and chains of `graph`.
+
+    Examples
+    --------
+    >>> graph = DependencyGraph({"a": ["b", "c"], "b": ["c"], "c": []})
+    >>> report = analyze(graph, top=1)
+    >>> report.fan_in, report.chains
+    ([('c', 2)], [('a', 'b', 'c')])
+    >>> report.closure_sizes
+    {'a': 2, 'b': 1, 'c': 0}
+    """
+
+    def most(counts: Mapping[str, int]) -> list[tuple[str, int]]:
+        ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+        return [(name, count) for name, count in ranked[:top] if count]
+
+    chains = sorted(
+        (
+            chain
+            for _, chain in graph.heaviest_chains(dict.fromkeys(graph.deps, 1)).values()
+        ),
+        key=lambda chain: (-len(chain), chain),
+    )
+    return GraphReport(
+        cycles=graph.cycles(),
+        fan_in=most({name: len(rdeps) for name, rdeps in graph.rdeps.items()}),
+        fan_out=most({name: len(deps) for name, deps in graph.deps.items()}),
+        chains=[chain for chain in chains[:top] if len(chain) > 1],
+        closure_sizes=graph.closure_sizes(),
+    )
+
+
+def format_text(report: GraphReport, *, top: int) -> str:
+    """Format `report` for people, including the `top` largest closures."""
+    lines = [f"import cycles: {len(report.cycles)}"]
+    lines.extend(f"  {', '.join(cycle)}" for cycle in report.cycles)
+    for title, counts in (
+        ("most imported", report.fan_in),
+        ("most imports", report.fan_out),
+    ):
+        lines.extend(["", f"{title}:"])
+        lines.extend(f"{count:>6}  {name}" for name, count in counts)
+    lines.extend(["", "longest import chains:"])
+    lines.extend(f"{len(chain):>6}  {' -> '.join(chain)}" for chain in report.chains)
+    lines.extend(["", "largest transitive closures:"])
+    lines.extend(
+        f"{size:>6}  {name}"
+        for name, size in sorted(
+            report.closure_sizes.items(), key=lambda item: (-item[1], item[0])
+        )[:top]
+    )
+    return "\n".join(lines)
+
+
+def format_json(report: GraphReport) -> str:
+    """Format `report` as a JSON object with a key for each of its fields."""
+    return json.dumps(report._asdict(), indent=2)
+
+
+def format_dot(graph: DependencyGraph, report: GraphReport) -> str:
+    """Format `graph` in the Graphviz DOT language.
+
+    Every node has a ``closure`` attribute with the size of its transitive
+    closure. Files in import cycles and the imports between them are red.
+
+    Examples
+    --------
+    >>> graph = DependencyGraph({"a": ["b"], "b": []})
+    >>> print(format_dot(graph, analyze(graph, top=1)))
+    digraph imports {
+      "a" [closure=1];
+      "b" [closure=0];
+      "a" -> "b";
+    }
+    """
+    cycle_of = {name: i for i, cycle in enumerate(report.cycles) for name in cycle}
+    lines = ["digraph imports {"]
+    for name in graph.deps:
+        attrs = f"closure={report.closure_sizes.get(name, 0)}"
+        if name in cycle_of:
+            attrs += ", color=red"
+        lines.append(f"  {json.dumps(name)} [{attrs}];")
+    for name, deps in graph.deps.items():
+        for dep in deps:
+            in_cycle = name in cycle_of and cycle_of[name] == cycle_of.get(dep)
+            attrs = " [color=red]" if in_cycle else ""
+            lines.append(f"  {json.dumps(name)} -> {json.dumps(dep)}{attrs};")
+    lines.append("}")
+    return "\n".join(lines)
@@ -0,0 +1,161 @@
+"""Measure how long importing generated modules takes."""
+
+from __future__ import annotations
+
+import os
+import re
+import subprocess
+import sys
+from typing import TYPE_CHECKING, NamedTuple
+
+from .packages import clean_proto_filename
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping, Sequence
+    from pathlib import Path
+
+    from .graph import DependencyGraph
+
+# a line of `python -X importtime` output, e.g.,
+# "import time:       123 |        456 |   pkg.a_pb2"
+_IMPORTTIME_PATTERN = re.compile(
+    r"^import time:\s+(?P<self>\d+) \|\s+(?P<cumulative>\d+) \| *(?P<name>\S+)$",
+    flags=re.MULTILINE,
+)
+
+# imports the modules named on stdin, one per line, in order; uses
+# `__import__` because `importlib.import_module` bypasses the import machinery
+# that `-X importtime` instruments
+_IMPORT_SCRIPT = """\
+import sys
+
+for name in sys.stdin.read().split():
+    __import__(name)
+"""
+
+
+class ImportProfileError(Exception):
+    """Raised when importing the generated modules fails."""
+
+
+class ImportTime(NamedTuple):
+    """Time in microseconds spent importing a module."""
+
+    self_time: int
+    cumulative_time: int
+
+
+def parse_importtime(output: str) -> dict[str, ImportTime]:
+    r"""Parse the report written to stderr by ``python -X importtime``.
+
+    Examples
+    --------
+    >>> output = "\n".join(
+    ...     [
+    ...         "import time: self [us] | cumulative | imported package",
+    ...         "import time:        12 |         12 |     pkg.b_pb2",
+    ...         "import time:       100 |        112 |   pkg.a_pb2",
+    ...     ]
+    ... )
+    >>> parse_importtime(output)["pkg.a_pb2"]
+    ImportTime(self_time=100, cumulative_time=112)
+    """
+    return {
+        match.group("name"): ImportTime(
+            int(match.group("self")), int(match.group("cumulative"))
+        )
+        for match in _IMPORTTIME_PATTERN.finditer(output)
+    }
+
+
+def module_names(python_out: Path, module_suffixes: Sequence[str]) -> list[str]:
+    """Compute the names of the generated modules under `python_out`.
+
+    Names are qualified with the name of `python_out`, which is imported as
+    a package from its parent directory.
+    """
+    suffixes = tuple(suffix for suffix in module_suffixes if suffix.endswith(".py"))
+    return [
+        ".".join((python_out.name, *path.relative_to(python_out).with_suffix("").parts))
+        for path in sorted(python_out.rglob("*.py"))
+        if path.name.endswith(suffixes)
+    ]
+
+
+def profile_imports(python_out: Path, modules: Sequence[str]) -> dict[str, ImportTime]:
+    """Import `modules` in a fresh interpreter and time every import.
+
+    Parameters
+    ----------
+    python_out
+        Directory containing the generated package, whose parent is put on
+        the module search path
+    modules
+        Names of the modules to import, in order
+
+    Returns
+    -------
+    dict[str, ImportTime]
+        Import times of every module imported by the interpreter, including
+        ones that aren't generated
+    """
+    path = [os.fspath(python_out.resolve().parent)]
+    if pythonpath := os.environ.get("PYTHONPATH"):
+        path.append(pythonpath)
+    proc = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", "-c", _IMPORT_SCRIPT],
+        input="\n".join(modules),
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(path)},
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if proc.returncode:
+        error = "\n".join(
+            line
+            for line in proc.stderr.splitlines()
+            if not line.startswith("import time:")
+        )
+        raise ImportProfileError(error)
+    return parse_importtime(proc.stderr)
+
+
+def format_report(
+    times: Mapping[str, ImportTime],
+    graph: DependencyGraph,
+    *,
+    package: str,
+    top: int,
+) -> str:
+    """Format the slowest modules of `package` and the heaviest import chains.
+
+    The weight of a proto file in a chain is the self time of its ``_pb2``
+    module, so the weight of a chain approximates the time it takes to
+    import the module at its head when none of its dependencies have been
+    imported yet.
+    """
+    modules = {
+        name: time for name, time in times.items() if name.startswith(f"{package}.")
+    }
+    width = max(map(len, modules), default=0)
+    lines = [f"{'module':<{width}}  {'self [us]':>10}  {'cumulative [us]':>15}"]
+    lines.extend(
+        f"{name:<{width}}  {time.self_time:>10}  {time.cumulative_time:>15}"
+        for name, time in sorted(
+            modules.items(), key=lambda item: item[1].cumulative_time, reverse=True
+        )[:top]
+    )
+
+    weights: dict[str, float] = {}
+    for fd_name in graph.deps:
+        module = ".".join((package, *f"{clean_proto_filename(fd_name)}_pb2".split("/")))
+        time = modules.get(module)
+        if time is not None:
+            weights[fd_name] = time.self_time
+
+    lines.extend(["", f"{'chain [us]':>10}  import chain"])
+    chains = sorted(graph.heaviest_chains(weights).values(), reverse=True)
+    lines.extend(
+        f"{weight:>10}  {' -> '.join(chain)}" for weight, chain in chains[:top]
+    )
+    return "\n".join(lines)
@@ -0,0 +1,123 @@
+"""A persistent record of previous rewrites used to skip unchanged files."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import stat
+import tempfile
+from typing import TYPE_CHECKING, Dict, List, Union
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping, Sequence
+    from pathlib import Path
+
+    from google.protobuf.descriptor_pb2 import FileDescriptorProto
+
+    from .graph import DependencyGraph
+
+    Entry = Dict[str, Union[str, List[str], Dict[str, str]]]
+
+_VERSION = 1
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def imports_digest(fd: FileDescriptorProto) -> str:
+    """Hash the parts of `fd` that rewriting its modules depends on.
+
+    That's its name and imports, so the hash is shared by the index and
+    :py:class:`~protoletariat.store.OutputStore` keys.
+    """
+    imports = [fd.name, list(fd.dependency), list(fd.public_dependency)]
+    return _digest(json.dumps(imports).encode())
+
+
+class RewriteIndex:
+    """The dependency graph and outputs of the last rewrite of each proto file.
+
+    For each proto file the index records its dependencies and reverse
+    dependencies, a hash of the parts of its descriptor that affect
+    rewriting, and a hash of every module rewritten from it keyed by module
+    suffix. A file whose imports and modules are unchanged since it was last
+    rewritten doesn't need to be rewritten again.
+
+    Parameters
+    ----------
+    path
+        Location of the index
+    params
+        Rewrite parameters that affect the output of every file. The
+        recorded entries are discarded if these differ from the ones the
+        index was written with.
+    """
+
+    def __init__(self, path: Path, *, params: Mapping[str, Sequence[str]]) -> None:
+        self.path = path
+        self.params = {key: list(value) for key, value in params.items()}
+        self.files: dict[str, Entry] = {}
+
+        try:
+            data = json.loads(path.read_text())
+        except FileNotFoundError:
+            return
+        if data.get("version") == _VERSION and data.get("params") == self.params:
+            self.files = data["files"]
+
+    def is_current(self, fd: FileDescriptorProto, sources: Mapping[str, str]) -> bool:
+        """Return whether `sources` are the last rewrite of the modules of `fd`.
+
+        Parameters
+        ----------
+        fd
+            The descriptor of a proto file
+        sources
+            Mapping of suffix to the current source of each existing module
+            generated from `fd`
+        """
+        entry = self.files.get(fd.name)
+        if entry is None or entry["imports"] != imports_digest(fd):
+            return False
+        return entry["modules"] == {
+            suffix: _digest(source.encode()) for suffix, source in sources.items()
+        }
+
+    def record(self, fd: FileDescriptorProto, outputs: Mapping[str, str]) -> None:
+        """Record `outputs`, the rewritten modules of `fd` keyed by suffix."""
+        self.files[fd.name] = {
+            "imports": imports_digest(fd),
+            "modules": {
+                suffix: _digest(output.encode()) for suffix, output in outputs.items()
+            },
+        }
+
+    def save(self, graph: DependencyGraph) -> None:
+        """Atomically write the index along with the dependencies in `graph`.
+
+        Entries of files that aren't in `graph` are dropped.
+        """
+        self.files = {
+            name: entry for name, entry in self.files.items() if name in graph.deps
+        }
+        for name, entry in self.files.items():
+            entry["deps"] = list(graph.deps.get(name, ()))
+            entry["rdeps"] = list(graph.rdeps.get(name, ()))
+
+        data = {"version": _VERSION, "params": self.params, "files": self.files}
+        try:
+            mode = stat.S_IMODE(self.path.stat().st_mode)
+        except FileNotFoundError:
+            mode = 0o644
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, sort_keys=True)
+            # mkstemp creates files only their owner can read
+            os.chmod(tmp, mode)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
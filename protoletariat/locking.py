@@ -0,0 +1,61 @@
+"""Locks serializing changes to a directory across processes.
+
+Several `protol` processes can fix imports in output trees that share parent
+packages. The `__init__` files of those packages are computed from their
+contents and rewritten by every process, so each process holds the lock of a
+package while it updates them.
+
+On POSIX systems the directory itself is locked with :py:func:`fcntl.flock`.
+Directories can't be opened on Windows, so a ``.protol.lock`` file in the
+directory is locked with :py:func:`msvcrt.locking` instead.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import os
+import sys
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from pathlib import Path
+
+LOCK_FILE_NAME = ".protol.lock"
+
+if sys.platform == "win32":
+    import msvcrt
+
+    @contextlib.contextmanager
+    def lock_directory(path: Path) -> Iterator[None]:
+        """Hold an exclusive lock on the directory `path`."""
+        with path.joinpath(LOCK_FILE_NAME).open(mode="a+b") as f:
+            f.seek(0)
+            while True:
+                # LK_LOCK gives up after trying for 10 seconds
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                except OSError:
+                    continue
+                break
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+else:
+    import fcntl
+
+    @contextlib.contextmanager
+    def lock_directory(path: Path) -> Iterator[None]:
+        """Hold an exclusive lock on the directory `path`."""
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            # locks taken through separate file descriptions conflict, so
+            # this also serializes threads of the same process
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            # closing the descriptor releases the lock
+            os.close(fd)
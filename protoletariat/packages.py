@@ -0,0 +1,231 @@
+"""The layout of generated packages.
+
+Computes the paths of the modules generated from proto files, the contents of
+the `__init__` files that turn directories of generated code into packages,
+and where that code lives inside archives. These only work on paths and
+strings, so they are shared by output trees on disk and in archives.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from pathlib import PurePath
+
+_PROTO_SUFFIX_PATTERN = re.compile(r"^(.+)\.proto$")
+
+
+def clean_proto_filename(name: str) -> str:
+    """Remove the `.proto` suffix from `name`.
+
+    Examples
+    --------
+    >>> clean_proto_filename("a/b.proto")
+    'a/b'
+    >>> clean_proto_filename("a/b-c.proto")
+    'a/b_c'
+    >>> clean_proto_filename("a/b_c.proto")
+    'a/b_c'
+    """
+    return _PROTO_SUFFIX_PATTERN.sub(r"\1", name).replace("-", "_")
+
+
+def archive_prefix(archive_root: str) -> str:
+    """Compute the prefix of the names of archive members under `archive_root`.
+
+    Examples
+    --------
+    >>> archive_prefix("")
+    ''
+    >>> archive_prefix("a/b/")
+    'a/b/'
+    >>> archive_prefix("/a")
+    'a/'
+    """
+    return f"{archive_root.strip('/')}/".lstrip("/")
+
+
+def _submodule_names(
+    entries: Iterable[tuple[PurePath, bool]], *, suffix: str
+) -> dict[str, None]:
+    """Compute the sorted names of the submodules of a package.
+
+    Parameters
+    ----------
+    entries
+        Pairs of the path of each entry in the package and whether the
+        entry is a directory
+    suffix
+        Suffix of the files that are modules
+
+    Examples
+    --------
+    >>> from pathlib import PurePosixPath
+    >>> entries = [
+    ...     (PurePosixPath("b_pb2.pyi"), False),
+    ...     (PurePosixPath("a"), True),
+    ...     (PurePosixPath("b_pb2.py"), False),
+    ...     (PurePosixPath("__init__.py"), False),
+    ... ]
+    >>> list(_submodule_names(entries, suffix=".py"))
+    ['a', 'b_pb2']
+    """
+    # use a dictionary to preserve order while deduplicating
+    return {
+        path.stem: None
+        for path, is_dir in sorted(entries)
+        if path.stem not in ("__init__", "__pycache__")
+        if path.suffix == suffix or is_dir
+    }
+
+
+def _pyi_init_lines(entries: Iterable[tuple[PurePath, bool]]) -> dict[str, None]:
+    """Compute the lines of an `__init__.pyi` from a package's entries.
+
+    Parameters
+    ----------
+    entries
+        Pairs of the path of each entry in the package and whether the
+        entry is a directory
+
+    Examples
+    --------
+    >>> from pathlib import PurePosixPath
+    >>> entries = [
+    ...     (PurePosixPath("b_pb2.pyi"), False),
+    ...     (PurePosixPath("a"), True),
+    ...     (PurePosixPath("b_pb2.py"), False),
+    ...     (PurePosixPath("__init__.pyi"), False),
+    ... ]
+    >>> print("".join(_pyi_init_lines(entries)), end="")
+    from . import a
+    from . import b_pb2
+    """
+    return {
+        f"from . import {name}\n": None
+        for name in _submodule_names(entries, suffix=".pyi")
+    }
+
+
+# an import of a submodule written by `_pyi_init_lines`
+_PYI_INIT_LINE_PATTERN = re.compile(r"^from \. import (\w+)\s*$")
+
+
+def pyi_init_source(
+    existing: str, entries: Iterable[tuple[PurePath, bool]]
+) -> str | None:
+    r"""Merge the imports of a package's submodules into its `__init__.pyi`.
+
+    Imports of submodules that no longer exist in the package, for example
+    because they were pruned, are removed.
+
+    Parameters
+    ----------
+    existing
+        Contents of the current `__init__.pyi`, empty if there is none
+    entries
+        Pairs of the path of each entry in the package and whether the
+        entry is a directory
+
+    Returns
+    -------
+    str | None
+        The new contents, or `None` if `existing` already imports exactly
+        the existing submodules
+
+    Examples
+    --------
+    >>> from pathlib import PurePosixPath
+    >>> entries = [(PurePosixPath("b_pb2.pyi"), False), (PurePosixPath("a"), True)]
+    >>> print(pyi_init_source("from . import b_pb2", entries), end="")
+    from . import b_pb2
+    from . import a
+    >>> pyi_init_source("from . import a\nfrom . import b_pb2\n", entries) is None
+    True
+    >>> print(pyi_init_source("from . import c_pb2\nx: int\n", entries), end="")
+    x: int
+    from . import a
+    from . import b_pb2
+    """
+    entries = list(entries)
+    names = {path.stem for path, _ in entries}
+    lines = existing.splitlines(keepends=True)
+    kept = [
+        line
+        for line in lines
+        if not (
+            (match := _PYI_INIT_LINE_PATTERN.match(line)) is not None
+            and match.group(1) not in names
+        )
+    ]
+    lines_to_write = _pyi_init_lines(entries)
+    for line in kept:
+        lines_to_write.pop(line if line.endswith("\n") else f"{line}\n", None)
+    if not lines_to_write and kept == lines:
+        return None
+    if kept and not kept[-1].endswith("\n"):
+        kept[-1] += "\n"
+    return "".join(kept) + "".join(lines_to_write)
+
+
+_LAZY_INIT_HEADER = (
+    "# Generated by protoletariat. Submodules are imported on first access.\n"
+)
+
+_LAZY_INIT_BODY = """
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return _importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted({*globals(), *_SUBMODULES})
+"""
+
+
+def lazy_init_source(
+    existing: str, entries: Iterable[tuple[PurePath, bool]]
+) -> str | None:
+    """Compute an `__init__.py` that imports submodules on first access.
+
+    The module defines a :pep:`562` ``__getattr__`` that imports submodules
+    when they're first accessed as attributes of the package, so importing
+    the package doesn't import every module in it.
+
+    Parameters
+    ----------
+    existing
+        Contents of the current `__init__.py`, empty if there is none
+    entries
+        Pairs of the path of each entry in the package and whether the
+        entry is a directory
+
+    Returns
+    -------
+    str | None
+        The new contents, or `None` if `existing` wasn't generated by us and
+        must be kept
+
+    Examples
+    --------
+    >>> from pathlib import PurePosixPath
+    >>> entries = [(PurePosixPath("b_pb2.py"), False), (PurePosixPath("a"), True)]
+    >>> print(lazy_init_source("", entries).splitlines()[3])
+    _SUBMODULES = frozenset(['a', 'b_pb2'])
+    >>> lazy_init_source("x = 1", entries) is None
+    True
+    """
+    if existing and not existing.startswith(_LAZY_INIT_HEADER):
+        return None
+    names = [
+        name for name in _submodule_names(entries, suffix=".py") if name.isidentifier()
+    ]
+    return (
+        f"{_LAZY_INIT_HEADER}import importlib as _importlib\n\n"
+        f"_SUBMODULES = frozenset({names!r})\n{_LAZY_INIT_BODY}"
+    )
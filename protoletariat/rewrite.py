@@ -1,11 +1,19 @@
 from __future__ import annotations
 
+import abc
 import ast
 import collections
 import collections.abc
-import typing
+import contextlib
+import functools
+import io
+import itertools
+import re
+import sys
+import threading
+import tokenize
 from ast import AST
-from typing import TYPE_CHECKING, Any, Callable, NamedTuple, Sequence, Union
+from typing import TYPE_CHECKING, Any, Callable, Container, NamedTuple, Sequence, Union
 
 try:
     from ast import unparse as astunparse
@@ -74,12 +82,12 @@ def matches(value: Node, pattern: Node) -> bool:
 
     # recur into non-str sequences
     if _is_iterable(value) and _is_iterable(pattern):
-        assert isinstance(
-            value, collections.abc.Iterable
-        ), f"value is not a non-str iterable {type(value).__name__}"
-        assert isinstance(
-            pattern, collections.abc.Iterable
-        ), f"pattern is not a non-str iterable {type(pattern).__name__}"
+        assert isinstance(value, collections.abc.Iterable), (
+            f"value is not a non-str iterable {type(value).__name__}"
+        )
+        assert isinstance(pattern, collections.abc.Iterable), (
+            f"pattern is not a non-str iterable {type(pattern).__name__}"
+        )
         return all(map(matches, value, pattern))
 
     # primitive value, such as None, True, False, etc.
@@ -87,9 +95,9 @@ def matches(value: Node, pattern: Node) -> bool:
         return value == pattern
 
     assert isinstance(value, AST), f"value is not an AST node: {type(value).__name__}"
-    assert isinstance(
-        pattern, AST
-    ), f"pattern is not an AST node: {type(pattern).__name__}"
+    assert isinstance(pattern, AST), (
+        f"pattern is not an AST node: {type(pattern).__name__}"
+    )
 
     return all(
         matches(getattr(value, field), getattr(pattern, field))
@@ -211,14 +219,126 @@ def build_rewrites(
         replacements.append(
             Replacement(
                 old=f"from {'.'.join(parts)}_pb2 import *",
-                new=f"from {'.' * (num_leading_dots - 1)}{from_}.{part}_pb2 import *",
+                new=f"from {_relative_module(proto, dep)} import *",
             ),
         )
     return replacements
 
 
+def _relative_module(proto: str, dep: str) -> str:
+    """Compute the relative name of the module of `dep` as seen from `proto`.
+
+    Examples
+    --------
+    >>> _relative_module("a", "b")
+    '.b_pb2'
+    >>> _relative_module("a", "c/d")
+    '.c.d_pb2'
+    >>> _relative_module("a/b", "c/d")
+    '..c.d_pb2'
+    """
+    return f"{'.' * (proto.count('/') + 1)}{dep.replace('/', '.')}_pb2"
+
+
+def build_reexport_rewrites(
+    proto: str, dep: str, *, names: Sequence[str], stub_names: Sequence[str]
+) -> list[Replacement]:
+    """Construct replacements that re-export the names of a public dependency.
+
+    Instead of a star import, modules import the names they re-export
+    explicitly, which saves copying the whole namespace of `dep` at import
+    time and can be understood by static analysis.
+
+    Parameters
+    ----------
+    proto
+        The dependent protobuf path.
+    dep
+        The `name` field of the `FileDescriptorProto` of the public
+        dependency, stripped of its ``.proto`` suffix.
+    names
+        Names that a star import of the module generated from `dep` brings
+        in, including the names `dep` itself re-exports.
+    stub_names
+        Names that stubs re-export from `dep`. Stubs generated by
+        mypy-protobuf import them in a single sorted statement, stubs
+        generated by protoc import messages and enums one by one. Both are
+        turned into explicit ``from ... import name as name`` re-exports.
+
+    Examples
+    --------
+    >>> from pprint import pprint
+    >>> pprint(
+    ...     build_reexport_rewrites(
+    ...         "a/b", "c/d", names=["D", "RED"], stub_names=["RED", "D"]
+    ...     )
+    ... )
+    [Replacement(old='from c.d_pb2 import *', new='from ..c.d_pb2 import D, RED'),
+     Replacement(old='from c.d_pb2 import D as D, RED as RED', new='from ..c.d_pb2 import D as D, RED as RED'),
+     Replacement(old='from c.d_pb2 import RED', new='from ..c.d_pb2 import RED as RED'),
+     Replacement(old='from c.d_pb2 import D', new='from ..c.d_pb2 import D as D')]
+    """
+    old_module = f"{dep.replace('/', '.')}_pb2"
+    new_module = _relative_module(proto, dep)
+
+    replacements = []
+    if names:
+        replacements.append(
+            Replacement(
+                old=f"from {old_module} import *",
+                new=f"from {new_module} import {', '.join(names)}",
+            )
+        )
+    if stub_names:
+        aliases = ", ".join(f"{name} as {name}" for name in sorted(stub_names))
+        replacements.append(
+            Replacement(
+                old=f"from {old_module} import {aliases}",
+                new=f"from {new_module} import {aliases}",
+            )
+        )
+        replacements.extend(
+            Replacement(
+                old=f"from {old_module} import {name}",
+                new=f"from {new_module} import {name} as {name}",
+            )
+            for name in stub_names
+        )
+    return replacements
+
+
+def unparse_import(node: ast.Import | ast.ImportFrom) -> str:
+    """Convert an import statement to source code.
+
+    Produces the same code as :py:func:`ast.unparse` without the overhead of
+    a general purpose unparser, which matters most on Python 3.8 where that
+    is the much slower third-party `astunparse` package.
+
+    Examples
+    --------
+    >>> import ast
+    >>> unparse_import(ast.parse("import a.b as c,  d").body[0])
+    'import a.b as c, d'
+    >>> unparse_import(ast.parse("from .. a import (b as c)").body[0])
+    'from ..a import b as c'
+    >>> unparse_import(ast.parse("from . import *").body[0])
+    'from . import *'
+    """
+    names = ", ".join(
+        alias.name if alias.asname is None else f"{alias.name} as {alias.asname}"
+        for alias in node.names
+    )
+    if isinstance(node, ast.Import):
+        return f"import {names}"
+    return f"from {'.' * (node.level or 0)}{node.module or ''} import {names}"
+
+
 class ImportNodeTransformer(ast.NodeTransformer):
-    """A NodeTransformer to apply rewrite rules."""
+    """A NodeTransformer to apply rewrite rules.
+
+    Instances track the imports they've produced, so use a new one for every
+    tree.
+    """
 
     def __init__(self, ast_rewriter: ASTRewriter) -> None:
         self.ast_rewriter = ast_rewriter
@@ -227,7 +347,10 @@ class ImportNodeTransformer(ast.NodeTransformer):
 
     def visit_Import(self, node: ast.AST) -> AST | None:
         result = self.ast_rewriter.rewrite(node)
-        code = astunparse(result)
+        assert isinstance(result, (ast.Import, ast.ImportFrom)), (
+            f"rewrite produced a non-import node: {type(result).__name__}"
+        )
+        code = unparse_import(result)
         if code not in self.seen:
             self.seen.add(code)
             return result
@@ -236,25 +359,296 @@ class ImportNodeTransformer(ast.NodeTransformer):
     visit_ImportFrom = visit_Import
 
 
-class ASTImportRewriter:
-    def __init__(self) -> None:
-        self.node_transformer = ImportNodeTransformer(ASTRewriter())
+def _replace(repl: AST, _: AST) -> AST:
+    return repl
+
 
+class ImportRewriter(abc.ABC):
+    """Rewrite the imports of modules according to registered rules.
+
+    Rewriting doesn't modify the rewriter, so once its rules are registered a
+    single instance can be used from multiple threads at the same time.
+    Rewriters can also be pickled to send them to other processes.
+
+    Imports that are identical to an import earlier in the module after
+    rewriting are removed.
+    """
+
+    @abc.abstractmethod
     def register_rewrite(self, replacement: Replacement) -> None:
         """Register a rewrite rule for turning `old` into `new`."""
-        (old_node,) = typing.cast(ast.Module, ast.parse(replacement.old)).body
-        (new_node,) = typing.cast(ast.Module, ast.parse(replacement.new)).body
 
-        def _rewrite(_: AST, repl: AST = new_node) -> AST:
-            return repl
+    @abc.abstractmethod
+    def rewrite(self, src: str) -> str:
+        """Rewrite the imports of the module whose source code is `src`."""
+
+
+# Some CPython releases before 3.13 track the recursion depth of converting
+# syntax trees to Python objects in interpreter-wide state, so concurrent calls
+# to `ast.parse` from threads can fail with a spurious `SystemError`. Those
+# builds hold the GIL for the whole call, so serializing it costs next to
+# nothing there. Newer releases, including free-threaded builds, parse
+# concurrently.
+_PARSE_LOCK: contextlib.AbstractContextManager[object] = (
+    threading.Lock() if sys.version_info < (3, 13) else contextlib.nullcontext()
+)
+
 
-        funcs = self.node_transformer.ast_rewriter.funcs
+def _parse(source: str) -> ast.Module:
+    """Parse `source`, safely with respect to other threads."""
+    with _PARSE_LOCK:
+        return ast.parse(source)
+
+
+class ASTImportRewriter(ImportRewriter):
+    """Rewrite imports by transforming the syntax tree of the module.
+
+    Modules are reformatted and lose their comments.
+    """
+
+    def __init__(self) -> None:
+        self.ast_rewriter = ASTRewriter()
+
+    def register_rewrite(self, replacement: Replacement) -> None:
+        (old_node,) = _parse(replacement.old).body
+        (new_node,) = _parse(replacement.new).body
+
+        funcs = self.ast_rewriter.funcs
         if all(not matches(old_node, pat) for pat, _ in funcs):
-            self.node_transformer.ast_rewriter.register(old_node)(_rewrite)
-        assert (
-            sum(matches(old_node, pat) for pat, _ in funcs) == 1
-        ), f"more than one rewrite rule found for pattern `{replacement.old}`"
+            self.ast_rewriter.register(old_node)(functools.partial(_replace, new_node))
+        assert sum(matches(old_node, pat) for pat, _ in funcs) == 1, (
+            f"more than one rewrite rule found for pattern `{replacement.old}`"
+        )
+
+    def rewrite(self, src: str) -> str:
+        node_transformer = ImportNodeTransformer(self.ast_rewriter)
+        return astunparse(node_transformer.visit(_parse(src)))
+
+
+def _canonical_import(code: str) -> str:
+    """Format the single import statement `code` like :py:func:`unparse_import`.
+
+    Examples
+    --------
+    >>> _canonical_import("from  ..a import (b,c as  d)")
+    'from ..a import b, c as d'
+    """
+    (node,) = _parse(code).body
+    assert isinstance(node, (ast.Import, ast.ImportFrom)), (
+        f"not an import statement: {code!r}"
+    )
+    return unparse_import(node)
+
+
+class _TextImportRewriter(ImportRewriter):
+    """Base class of rewriters that edit import statements in place.
+
+    Everything other than import statements, including formatting and
+    comments, is left untouched.
+    """
+
+    def __init__(self) -> None:
+        # canonical old import to canonical new import
+        self.replacements: dict[str, str] = {}
+
+    def register_rewrite(self, replacement: Replacement) -> None:
+        self.replacements.setdefault(
+            _canonical_import(replacement.old), _canonical_import(replacement.new)
+        )
+
+
+class TokenizeImportRewriter(_TextImportRewriter):
+    """Rewrite imports found by tokenizing the module.
+
+    Import statements are recognized however they're formatted, and never
+    inside strings or comments. Statements that share a line with another
+    statement are left alone.
+    """
+
+    def rewrite(self, src: str) -> str:
+        lines = io.StringIO(src).readlines()
+        line_offsets = [0, *itertools.accumulate(map(len, lines))]
+
+        def offset(position: tuple[int, int]) -> int:
+            row, col = position
+            return line_offsets[row - 1] + col
+
+        pieces = []
+        last = 0
+        seen: set[str] = set()
+        statement: list[tokenize.TokenInfo] = []
+        for token in tokenize.generate_tokens(iter(lines).__next__):
+            if token.type != tokenize.NEWLINE:
+                if token.type not in _NON_CODE_TOKENS:
+                    statement.append(token)
+                continue
+
+            if _is_import_statement(statement):
+                first, *_, last_token = statement
+                start, end = offset(first.start), offset(last_token.end)
+                old = _canonical_import(src[start:end])
+                code = self.replacements.get(old, old)
+                if code in seen:
+                    # remove the whole line, up to and including the newline
+                    start, end = line_offsets[first.start[0] - 1], offset(token.end)
+                    code = ""
+                else:
+                    seen.add(code)
+                pieces.append(src[last:start])
+                pieces.append(code)
+                last = end
+            statement.clear()
+        pieces.append(src[last:])
+        return "".join(pieces)
+
+
+def _is_import_statement(tokens: Sequence[tokenize.TokenInfo]) -> bool:
+    """Return whether `tokens` form a single import statement."""
+    return (
+        bool(tokens)
+        and tokens[0].type == tokenize.NAME
+        and tokens[0].string in _IMPORT_KEYWORDS
+        and not any(token.exact_type == tokenize.SEMI for token in tokens)
+    )
+
+
+class RegexImportRewriter(_TextImportRewriter):
+    """Rewrite imports found by matching each line against a pattern.
+
+    Only import statements that fit on one line and don't use parentheses or
+    semicolons are recognized, which covers the code generated by protoc.
+    Lines inside strings that look like imports are rewritten too.
+    """
+
+    def rewrite(self, src: str) -> str:
+        seen: set[str] = set()
+
+        def replace(match: re.Match[str]) -> str:
+            old = _normalize_import_line(match.group("statement"))
+            code = self.replacements.get(old, old)
+            if code in seen:
+                return ""
+            seen.add(code)
+            indent, rest, eol = match.group("indent", "rest", "eol")
+            return f"{indent}{code}{rest}{eol}"
+
+        return _IMPORT_LINE_PATTERN.sub(replace, src)
+
+
+_NON_CODE_TOKENS = frozenset(
+    (tokenize.COMMENT, tokenize.NL, tokenize.INDENT, tokenize.DEDENT)
+)
+_IMPORT_KEYWORDS = frozenset(("import", "from"))
+
+_IMPORT_LINE_PATTERN = re.compile(
+    r"^(?P<indent>[ \t]*)"
+    r"(?P<statement>(?:import|from)[ \t][^\n#;()\\]*?)"
+    r"(?P<rest>[ \t]*(?:#[^\n]*)?)"
+    r"(?P<eol>\n|\Z)",
+    flags=re.MULTILINE,
+)
+
+
+def _normalize_import_line(statement: str) -> str:
+    """Normalize whitespace in an import statement.
+
+    Examples
+    --------
+    >>> _normalize_import_line("import  a as b ,c")
+    'import a as b, c'
+    """
+    return re.sub(r" ?, ?", ", ", " ".join(statement.split()))
+
+
+def contains_import(src: str, imports: Container[str]) -> bool:
+    r"""Return whether a line of `src` is one of the import statements in `imports`.
+
+    This is much cheaper than rewriting `src`: only lines containing
+    ``import`` are looked at, and only their whitespace is normalized. The
+    statements in `imports` must be formatted like those produced by
+    :py:func:`build_rewrites`, which never import more than one name.
+
+    Examples
+    --------
+    >>> contains_import("x = 1\nimport  a_pb2 as a__pb2  # a\n", {"import a_pb2 as a__pb2"})
+    True
+    >>> contains_import("from . import a_pb2 as a__pb2\n", {"import a_pb2 as a__pb2"})
+    False
+    """
+    pos = src.find("import ")
+    while pos != -1:
+        start = src.rfind("\n", 0, pos) + 1
+        end = src.find("\n", pos)
+        if end == -1:
+            end = len(src)
+        statement, _, _ = src[start:end].partition("#")
+        if " ".join(statement.split()) in imports:
+            return True
+        pos = src.find("import ", end)
+    return False
+
+
+ENGINES: dict[str, type[ImportRewriter]] = {
+    "ast": ASTImportRewriter,
+    "tokenize": TokenizeImportRewriter,
+    "regex": RegexImportRewriter,
+}
+
+
+class EngineMismatchError(Exception):
+    """Raised when two engines rewrite the same module differently."""
+
+
+def _imports(tree: AST) -> list[str]:
+    return [
+        unparse_import(node)
+        for node in ast.walk(tree)
+        if isinstance(node, (ast.Import, ast.ImportFrom))
+    ]
+
+
+class CrossValidatingRewriter(ImportRewriter):
+    """Rewrite with two engines and check that they agree.
+
+    The output of `rewriter` is returned. An :py:class:`EngineMismatchError`
+    is raised when the syntax tree of the module produced by `reference`
+    differs from it.
+
+    Parameters
+    ----------
+    rewriter
+        Rewriter whose output is returned
+    reference
+        Rewriter to check the output of `rewriter` against
+    name
+        Name of the rewritten file to report in errors
+    """
+
+    def __init__(
+        self, rewriter: ImportRewriter, reference: ImportRewriter, *, name: str
+    ) -> None:
+        self.rewriter = rewriter
+        self.reference = reference
+        self.name = name
+
+    def register_rewrite(self, replacement: Replacement) -> None:
+        self.rewriter.register_rewrite(replacement)
+        self.reference.register_rewrite(replacement)
 
     def rewrite(self, src: str) -> str:
-        self.node_transformer.seen.clear()
-        return astunparse(self.node_transformer.visit(ast.parse(src)))
+        result = self.rewriter.rewrite(src)
+        tree = _parse(result)
+        expected_tree = _parse(self.reference.rewrite(src))
+        if ast.dump(tree) != ast.dump(expected_tree):
+            imports, expected_imports = _imports(tree), _imports(expected_tree)
+            difference = (
+                f"imports {imports} != {expected_imports}"
+                if imports != expected_imports
+                else "modules differ outside of imports"
+            )
+            raise EngineMismatchError(
+                f"{type(self.rewriter).__name__} and "
+                f"{type(self.reference).__name__} disagree on a module "
+                f"generated from {self.name}: {difference}"
+            )
+        return result
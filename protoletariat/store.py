@@ -0,0 +1,183 @@
+"""A content-addressed store of rewritten modules shared by output trees.
+
+Rewriting a module depends only on its source, the imports of the proto file
+it was generated from and the rewrite parameters. The store maps a hash of
+those inputs to the rewritten module, so the same generated code rewritten
+in many checkouts or worktrees is only rewritten once. Everywhere else the
+stored module is linked into place.
+
+The store is laid out as::
+
+    <root>/keys/<input digest[:2]>/<input digest>     digest of the output
+    <root>/objects/<digest[:2]>/<digest>              rewritten module
+
+Objects are read-only. Modules are copies of their object by default.
+Modules hardlinked to an object share its contents, so they must be replaced,
+for example by deleting them before running protoc again, rather than written
+to.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from typing import TYPE_CHECKING
+
+from . import __version__
+from .index import imports_digest
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # type: ignore[assignment]
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping, Sequence
+    from pathlib import Path
+
+    from google.protobuf.descriptor_pb2 import FileDescriptorProto
+
+LINK_MODES = ("hardlink", "reflink", "copy")
+
+# the FICLONE ioctl of Linux, which makes a copy-on-write clone of a file
+_FICLONE = 0x40049409
+
+
+class OutputStore:
+    """Store rewritten modules under `root`, keyed by their inputs.
+
+    Parameters
+    ----------
+    root
+        Directory of the store, created if necessary
+    params
+        Rewrite parameters that affect the output of every module, such as
+        the engine and exclusion patterns
+    link
+        How modules are materialized from the store, one of
+        :py:data:`LINK_MODES`. Hardlinks and reflinks fall back to copying
+        if the store and the module are on different filesystems.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        *,
+        params: Mapping[str, bool | str | Sequence[str]],
+        link: str = "copy",
+    ) -> None:
+        if link not in LINK_MODES:
+            raise ValueError(f"unsupported link mode: {link!r}")
+        self.root = root
+        self.link = link
+        self.params = hashlib.sha256(
+            json.dumps({"version": __version__, **params}, sort_keys=True).encode()
+        ).digest()
+
+    def key(
+        self,
+        fd: FileDescriptorProto,
+        source: str,
+        *,
+        reexports: Mapping[str, Sequence[Sequence[str]]] | None = None,
+    ) -> str:
+        """Hash the inputs of rewriting `source`, a module generated from `fd`.
+
+        `reexports` are the names re-exported explicitly from each public
+        dependency of `fd`, which can change without `fd` changing.
+        """
+        digest = hashlib.sha256(self.params)
+        digest.update(imports_digest(fd).encode())
+        if reexports:
+            digest.update(json.dumps(sorted(reexports.items())).encode())
+        digest.update(source.encode())
+        return digest.hexdigest()
+
+    def _path(self, kind: str, digest: str) -> Path:
+        return self.root.joinpath(kind, digest[:2], digest)
+
+    def _read_object(self, digest: str) -> bytes | None:
+        """Read the object `digest`, unless it's missing or was modified."""
+        try:
+            data = self._path("objects", digest).read_bytes()
+        except FileNotFoundError:
+            return None
+        return data if hashlib.sha256(data).hexdigest() == digest else None
+
+    def get(self, key: str) -> Path | None:
+        """Return the path of the stored output of `key`, if there is one.
+
+        Objects whose contents no longer match their digest, for example
+        because a hardlinked module was written to, are ignored.
+        """
+        try:
+            digest = self._path("keys", key).read_text()
+        except FileNotFoundError:
+            return None
+        if self._read_object(digest) is None:
+            return None
+        return self._path("objects", digest)
+
+    def put(self, key: str, output: str) -> Path:
+        """Store `output` as the output of `key` and return its path."""
+        data = output.encode()
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path("objects", digest)
+        if self._read_object(digest) is None:
+            _write_atomically(path, data, mode=0o444)
+        _write_atomically(self._path("keys", key), digest.encode(), mode=0o644)
+        return path
+
+    def materialize(self, obj: Path, python_file: Path) -> None:
+        """Replace `python_file` with a link to, or a copy of, `obj`."""
+        with contextlib.suppress(FileNotFoundError):
+            if os.path.samefile(obj, python_file):
+                return
+
+        tmp = python_file.with_name(f".{python_file.name}.{uuid.uuid4().hex}")
+        try:
+            if self.link == "hardlink":
+                try:
+                    os.link(obj, tmp)
+                except OSError:
+                    shutil.copyfile(obj, tmp)
+            elif self.link == "reflink":
+                _reflink(obj, tmp)
+            else:
+                shutil.copyfile(obj, tmp)
+            os.replace(tmp, python_file)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                tmp.unlink()
+            raise
+
+
+def _reflink(src: Path, dst: Path) -> None:
+    """Clone `src` to `dst`, copying it if cloning isn't supported."""
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+            except OSError:
+                pass
+            else:
+                return
+        shutil.copyfileobj(s, d)
+
+
+def _write_atomically(path: Path, data: bytes, *, mode: int) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
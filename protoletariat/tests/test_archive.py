@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import csv
+import io
+import stat
+import tarfile
+import zipfile
+from typing import TYPE_CHECKING
+
+import pytest
+from google.protobuf.descriptor_pb2 import FileDescriptorProto, FileDescriptorSet
+
+from protoletariat.__main__ import main
+from protoletariat.archive import _package_files, _record_hash
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from click.testing import CliRunner
+
+    from .conftest import ProtoletariatFixture
+
+
+def test_wheel_in_place(cli: CliRunner, tmp_path: Path) -> None:
+    fdset = FileDescriptorSet(
+        file=[
+            FileDescriptorProto(name="a/b.proto", dependency=["c.proto"]),
+            FileDescriptorProto(name="c.proto"),
+        ]
+    )
+    fdset_path = tmp_path / "fdset.bin"
+    fdset_path.write_bytes(fdset.SerializeToString())
+
+    wheel = tmp_path / "pkg-1.0-py3-none-any.whl"
+    with zipfile.ZipFile(wheel, mode="w") as zf:
+        zf.writestr("pkg/a/b_pb2.py", "import c_pb2 as c__pb2\n")
+        zf.writestr("pkg/c_pb2.py", "")
+        zf.writestr("pkg/c_pb2.pyi", "")
+        zf.writestr("pkg-1.0.dist-info/METADATA", "Name: pkg\n")
+        zf.writestr("pkg-1.0.dist-info/RECORD", "pkg-1.0.dist-info/RECORD,,\n")
+    wheel.chmod(0o644)
+
+    result = cli.invoke(
+        main,
+        [
+            "--python-out",
+            str(wheel),
+            "--archive-root",
+            "pkg",
+            "--in-place",
+            "--create-package",
+            "raw",
+            str(fdset_path),
+        ],
+        catch_exceptions=False,
+    )
+    assert result.exit_code == 0
+    assert stat.S_IMODE(wheel.stat().st_mode) == 0o644
+
+    with zipfile.ZipFile(wheel) as zf:
+        names = zf.namelist()
+        b_pb2 = zf.read("pkg/a/b_pb2.py")
+        init_pyi = zf.read("pkg/__init__.pyi").decode()
+        record = zf.read("pkg-1.0.dist-info/RECORD").decode()
+
+    assert b_pb2.decode() == "from .. import c_pb2 as c__pb2"
+    assert {"pkg/__init__.py", "pkg/a/__init__.py"} <= set(names)
+    assert not any(name.startswith("pkg-1.0.dist-info/__init__") for name in names)
+    assert init_pyi.splitlines() == ["from . import a", "from . import c_pb2"]
+
+    # RECORD is written last and describes the rewritten members
+    assert names[-1] == "pkg-1.0.dist-info/RECORD"
+    rows = {row[0]: row[1:] for row in csv.reader(io.StringIO(record))}
+    assert rows["pkg/a/b_pb2.py"] == [_record_hash(b_pb2), str(len(b_pb2))]
+    assert rows["pkg-1.0.dist-info/RECORD"] == ["", ""]
+    assert "pkg/a/__init__.py" in rows
+
+
+def test_zip_not_in_place(cli: CliRunner, tmp_path: Path) -> None:
+    fdset = FileDescriptorSet(
+        file=[FileDescriptorProto(name="a.proto", dependency=["b.proto"])]
+    )
+    fdset_path = tmp_path / "fdset.bin"
+    fdset_path.write_bytes(fdset.SerializeToString())
+
+    archive = tmp_path / "generated.zip"
+    with zipfile.ZipFile(archive, mode="w") as zf:
+        zf.writestr("a_pb2.py", "import b_pb2 as b__pb2\n")
+
+    result = cli.invoke(main, ["--python-out", str(archive), "raw", str(fdset_path)])
+    assert result.exit_code == 0
+    assert "from . import b_pb2 as b__pb2" in result.stdout.splitlines()
+
+    # the archive is untouched
+    with zipfile.ZipFile(archive) as zf:
+        assert zf.read("a_pb2.py") == b"import b_pb2 as b__pb2\n"
+
+
+def test_package_stub_without_trailing_newline(tmp_path: Path) -> None:
+    archive = tmp_path / "generated.zip"
+    with zipfile.ZipFile(archive, mode="w") as zf:
+        zf.writestr("a_pb2.pyi", "")
+        zf.writestr("b_pb2.pyi", "")
+        zf.writestr("__init__.pyi", "from . import a_pb2")
+
+    with zipfile.ZipFile(archive) as zf:
+        files = _package_files(zf, "", {}, lazy_init=False)
+
+    assert files["__init__.pyi"].decode().splitlines() == [
+        "from . import a_pb2",
+        "from . import b_pb2",
+    ]
+
+
+@pytest.mark.parametrize("output_format", ["tar", "zip"])
+def test_archive_output(
+    cli: CliRunner, basic_cli: ProtoletariatFixture, output_format: str
+) -> None:
+    result = basic_cli.generate(cli, args=["--output-format", output_format])
+    assert result.exit_code == 0
+
+    buf = io.BytesIO(result.stdout_bytes)
+    if output_format == "tar":
+        with tarfile.open(fileobj=buf) as tar:
+            members = {
+                member.name: tar.extractfile(member).read().decode()  # type: ignore[union-attr]
+                for member in tar.getmembers()
+            }
+    else:
+        with zipfile.ZipFile(buf) as zf:
+            members = {name: zf.read(name).decode() for name in zf.namelist()}
+
+    assert {"this_pb2.py", "other_pb2.py", "baz/bizz_buzz_pb2.py"} <= members.keys()
+    assert (
+        "from . import other_pb2 as other__pb2" in members["this_pb2.py"].splitlines()
+    )
+
+    result = basic_cli.generate(
+        cli, args=["--in-place", "--output-format", output_format]
+    )
+    assert result.exit_code == 2
+    assert "cannot be combined with --in-place" in result.output
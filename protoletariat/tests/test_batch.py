@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import json
+import shutil
+import subprocess
+from typing import TYPE_CHECKING
+
+import pytest
+
+from protoletariat.__main__ import main
+from protoletariat.batch import BatchError, load_manifest
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from click.testing import CliRunner
+
+
+@pytest.fixture
+def trees(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Generate code for two protos sharing a dependency into two trees."""
+    if shutil.which("protoc") is None:
+        pytest.skip("protoc not found")
+
+    monkeypatch.chdir(tmp_path)
+    protos = tmp_path / "protos"
+    protos.mkdir()
+    protos.joinpath("common.proto").write_text(
+        'syntax = "proto3";\nmessage Common {}\n'
+    )
+    for name in "ab":
+        protos.joinpath(f"{name}.proto").write_text(
+            'syntax = "proto3";\nimport "common.proto";\n'
+            f"message {name.upper()} {{ Common common = 1; }}\n"
+        )
+        tmp_path.joinpath(name).mkdir()
+        subprocess.run(  # noqa: S603
+            [  # noqa: S607
+                "protoc",
+                "--proto_path=protos",
+                f"--python_out={name}",
+                "--include_imports",
+                f"--descriptor_set_out={name}.bin",
+                f"protos/{name}.proto",
+                "protos/common.proto",
+            ],
+            check=True,
+        )
+    return tmp_path
+
+
+@pytest.mark.parametrize("jobs", [[], ["--jobs", "2"]], ids=["serial", "parallel"])
+def test_batch(cli: CliRunner, trees: Path, jobs: list[str]) -> None:
+    manifest = [
+        {
+            "generator": "protoc",
+            "python_out": "a",
+            "proto_paths": ["protos"],
+            "protoc_args": ["protos/a.proto"],
+        },
+        {
+            "generator": "raw",
+            "python_out": "b",
+            "descriptor_set": "b.bin",
+            "create_package": True,
+        },
+    ]
+    trees.joinpath("manifest.json").write_text(json.dumps(manifest))
+
+    result = cli.invoke(main, ["--in-place", *jobs, "batch", "manifest.json"])
+    assert result.exit_code == 0, result.output
+
+    for name in "ab":
+        lines = trees.joinpath(name, f"{name}_pb2.py").read_text().splitlines()
+        assert "from . import common_pb2 as common__pb2" in lines
+    assert trees.joinpath("b", "__init__.py").exists()
+    assert not trees.joinpath("a", "__init__.py").exists()
+
+
+def test_batch_requires_in_place(cli: CliRunner, trees: Path) -> None:
+    trees.joinpath("manifest.json").write_text("[]")
+    result = cli.invoke(main, ["batch", "manifest.json"])
+    assert result.exit_code == 2
+    assert "batch requires --in-place" in result.output
+
+
+@pytest.mark.parametrize(
+    ("entry", "message"),
+    [
+        ({"generator": "make", "python_out": "a"}, "has generator 'make'"),
+        ({"generator": "buf"}, "missing 'python_out'"),
+        ({"generator": "raw", "python_out": "missing"}, "is not a directory"),
+        ({"generator": "protoc", "python_out": "a"}, "missing 'proto_paths'"),
+        (
+            {"generator": "buf", "python_out": "a", "in_place": False},
+            "unknown option 'in_place'",
+        ),
+        (
+            {"generator": "buf", "python_out": "a", "engine": "sed"},
+            "invalid value for 'engine'",
+        ),
+    ],
+)
+def test_load_manifest_errors(
+    trees: Path, entry: dict[str, object], message: str
+) -> None:
+    manifest = trees.joinpath("manifest.json")
+    manifest.write_text(json.dumps([entry]))
+    with pytest.raises(BatchError, match=message):
+        load_manifest(manifest)
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import pytest
+from google.protobuf.descriptor_pb2 import FileDescriptorProto, FileDescriptorSet
+
+from protoletariat.__main__ import main
+from protoletariat.fdsetgen import Raw
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from click.testing import CliRunner
+
+    from .conftest import ProtoletariatFixture
+
+
+@pytest.mark.parametrize("engine", ["ast", "regex"])
+def test_check(cli: CliRunner, basic_cli: ProtoletariatFixture, engine: str) -> None:
+    this_pb2 = basic_cli.package_dir.joinpath("this_pb2.py")
+
+    result = basic_cli.generate(cli, args=["--check", "--all"])
+    assert result.exit_code == 1
+    stale = result.stderr.splitlines()
+    assert f"would rewrite {this_pb2}" in stale
+    # nothing is written
+    assert "import other_pb2 as other__pb2" in this_pb2.read_text().splitlines()
+    assert not result.stdout
+
+    result = basic_cli.generate(cli, args=["--check"])
+    assert result.exit_code == 1
+    assert len(result.stderr.splitlines()) == 1
+
+    result = basic_cli.generate(cli, args=["--in-place", "--engine", engine])
+    assert result.exit_code == 0
+    result = cli.invoke(
+        main,
+        ["--python-out", str(basic_cli.package_dir), "--check", "--all", "scan"],
+        catch_exceptions=False,
+    )
+    assert result.exit_code == 0
+    assert not result.output
+
+
+def test_check_imports(tmp_path: Path) -> None:
+    generator = Raw(
+        FileDescriptorSet(
+            file=[
+                FileDescriptorProto(name="c.proto"),
+                FileDescriptorProto(name="a.proto", dependency=["c.proto"]),
+                FileDescriptorProto(name="b.proto", dependency=["c.proto"]),
+            ]
+        ).SerializeToString()
+    )
+    for name in "abc":
+        tmp_path.joinpath(f"{name}_pb2.py").write_text("import c_pb2 as c__pb2\n")
+
+    def check(*, find_all: bool) -> list[str]:
+        stale = generator.check_imports(
+            python_out=tmp_path,
+            module_suffixes=["_pb2.py"],
+            exclude_imports_glob=[],
+            find_all=find_all,
+        )
+        return [path.name for path in stale]
+
+    assert check(find_all=False) == ["c_pb2.py"]
+    assert check(find_all=True) == ["c_pb2.py", "a_pb2.py", "b_pb2.py"]
+
+    tmp_path.joinpath("a_pb2.py").write_text("from . import c_pb2 as c__pb2\n")
+    assert check(find_all=True) == ["c_pb2.py", "b_pb2.py"]
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import importlib.util
+import marshal
+import stat
+import struct
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pytest
+
+if TYPE_CHECKING:
+    from click.testing import CliRunner
+
+    from .conftest import ProtoletariatFixture
+
+
+@pytest.mark.parametrize("jobs", [[], ["--jobs", "2"]], ids=["serial", "parallel"])
+def test_compile_bytecode(
+    cli: CliRunner, basic_cli: ProtoletariatFixture, jobs: list[str]
+) -> None:
+    result = basic_cli.generate(cli, args=["--compile-bytecode"])
+    assert result.exit_code == 2
+    assert "--compile-bytecode requires --in-place" in result.output
+
+    result = basic_cli.generate(cli, args=["--in-place", "--compile-bytecode", *jobs])
+    assert result.exit_code == 0
+
+    this_pb2 = basic_cli.package_dir.joinpath("this_pb2.py")
+    pyc = Path(importlib.util.cache_from_source(str(this_pb2)))
+    data = pyc.read_bytes()
+    magic, flags, mtime, size = struct.unpack("<4sIII", data[:16])
+    st = this_pb2.stat()
+    assert (magic, flags, mtime, size) == (
+        importlib.util.MAGIC_NUMBER,
+        0,
+        int(st.st_mtime),
+        st.st_size,
+    )
+    # readable by everyone who can read the source
+    this_pb2.chmod(0o644)
+    result = basic_cli.generate(cli, args=["--in-place", "--compile-bytecode", *jobs])
+    assert result.exit_code == 0
+    assert stat.S_IMODE(pyc.stat().st_mode) == 0o644
+    data = pyc.read_bytes()
+    code = marshal.loads(data[16:])  # noqa: S302
+    assert code.co_filename == str(this_pb2)
+    assert (
+        code.co_consts == compile(this_pb2.read_text(), str(this_pb2), "exec").co_consts
+    )
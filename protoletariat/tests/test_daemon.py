@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import importlib
+import subprocess
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pytest
+
+from protoletariat.daemon import Server
+
+from .conftest import ProtoletariatFixture, check_import_lines
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
+
+    from click.testing import CliRunner
+
+
+@pytest.fixture
+def server() -> Generator[Server, None, None]:
+    # keep the socket path short, unix domain socket paths are length limited
+    with tempfile.TemporaryDirectory() as d:
+        server = Server(Path(d, "protol.sock"))
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield server
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+
+def test_daemon(
+    cli: CliRunner, basic_cli: ProtoletariatFixture, server: Server
+) -> None:
+    daemon_args = ["--daemon-socket", str(server.socket_path)]
+    result = basic_cli.generate(cli, args=daemon_args)
+    assert result.exit_code == 0
+
+    expected_lines = [
+        "from . import other_pb2 as other__pb2",
+        "from .baz import bizz_buzz_pb2 as baz_dot_bizz__buzz__pb2",
+    ]
+    check_import_lines(result, expected_lines)
+
+    result = basic_cli.generate(
+        cli, args=[*daemon_args, "--in-place", "--create-package"]
+    )
+    assert result.exit_code == 0
+
+    # the second request reuses the decoded descriptor set
+    assert len(server.cache.fdsets) == 1
+
+    with basic_cli.patched_syspath:
+        importlib.import_module(basic_cli.package_name)
+        importlib.import_module(f"{basic_cli.package_name}.this_pb2")
+
+
+def test_daemon_not_running(
+    cli: CliRunner, basic_cli: ProtoletariatFixture, tmp_path: Path
+) -> None:
+    result = basic_cli.generate(
+        cli, args=["--daemon-socket", str(tmp_path / "missing.sock")]
+    )
+    assert result.exit_code == 1
+    assert "daemon request failed" in result.output
+
+
+def test_client_does_not_import_protobuf() -> None:
+    code = (
+        "import sys\n"
+        "from protoletariat import __main__, daemon\n"
+        "print('google.protobuf' in sys.modules)\n"
+    )
+    proc = subprocess.run(  # noqa: S603
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    )
+    assert proc.stdout == "False\n"
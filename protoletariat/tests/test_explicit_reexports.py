@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import shutil
+import subprocess
+import sys
+from typing import TYPE_CHECKING
+
+import pytest
+from google.protobuf.descriptor_pb2 import FileDescriptorProto, FileDescriptorSet
+
+from protoletariat import fdsetgen
+from protoletariat.__main__ import main
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from click.testing import CliRunner
+
+
+@pytest.mark.parametrize("engine", ["ast", "tokenize", "regex"])
+@pytest.mark.parametrize("stubs", ["pyi", "mypy"])
+def test_explicit_reexports(
+    cli: CliRunner,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    engine: str,
+    stubs: str,
+) -> None:
+    if shutil.which("protoc") is None:
+        pytest.skip("protoc not found")
+    if stubs == "mypy" and shutil.which("protoc-gen-mypy") is None:
+        pytest.skip("protoc-gen-mypy not found")
+    if stubs == "mypy" and engine == "regex":
+        pytest.skip("the regex engine doesn't rewrite parenthesized imports")
+
+    monkeypatch.chdir(tmp_path)
+    protos = tmp_path / "protos"
+    protos.joinpath("sub").mkdir(parents=True)
+    protos.joinpath("sub", "c.proto").write_text(
+        'syntax = "proto3";\nenum Color { RED = 0; BLUE = 1; }\n'
+    )
+    protos.joinpath("sub", "b.proto").write_text(
+        'syntax = "proto3";\nimport public "sub/c.proto";\nmessage B { Color c = 1; }\n'
+    )
+    protos.joinpath("a.proto").write_text(
+        'syntax = "proto3";\nimport public "sub/b.proto";\nmessage A { B b = 1; }\n'
+    )
+    out = tmp_path / "out"
+    out.mkdir()
+    subprocess.run(  # noqa: S603
+        [  # noqa: S607
+            "protoc",
+            "--proto_path=protos",
+            "--python_out=out",
+            f"--{stubs}_out=out",
+            "--include_imports",
+            "--descriptor_set_out=fdset.bin",
+            "a.proto",
+            "sub/b.proto",
+            "sub/c.proto",
+        ],
+        check=True,
+    )
+
+    result = cli.invoke(
+        main,
+        [
+            "--python-out",
+            "out",
+            "--in-place",
+            "--create-package",
+            "--explicit-reexports",
+            "--engine",
+            engine,
+            "raw",
+            "fdset.bin",
+        ],
+        catch_exceptions=False,
+    )
+    assert result.exit_code == 0
+
+    a_lines = out.joinpath("a_pb2.py").read_text().splitlines()
+    assert "from .sub.b_pb2 import B, Color, RED, BLUE" in a_lines
+    assert "from ..sub.c_pb2 import Color, RED, BLUE" in (
+        out.joinpath("sub", "b_pb2.py").read_text().splitlines()
+    )
+    assert not any(line.endswith("import *") for line in a_lines)
+
+    # stubs only re-export the names defined by the dependency itself
+    a_stub = " ".join(out.joinpath("a_pb2.pyi").read_text().split())
+    assert "from .sub.b_pb2 import B as B" in a_stub.replace("( ", "")
+    assert "from sub.b_pb2" not in a_stub
+
+    check = ["--python-out", "out", "--check", "--all", "raw", "fdset.bin"]
+    result = cli.invoke(main, ["--explicit-reexports", *check], catch_exceptions=False)
+    assert result.exit_code == 0
+    # star imports are expected without the option
+    result = cli.invoke(main, check, catch_exceptions=False)
+    assert result.exit_code == 1
+    assert "would rewrite out/a_pb2.py" in result.output
+
+    script = """\
+import out.a_pb2
+import out.sub.c_pb2
+assert out.a_pb2.RED == out.sub.c_pb2.RED
+assert out.a_pb2.Color is out.sub.c_pb2.Color
+assert out.a_pb2.B().c == out.a_pb2.RED
+"""
+    subprocess.run([sys.executable, "-c", script], cwd=tmp_path, check=True)  # noqa: S603
+
+
+def test_reexported_names() -> None:
+    fdset = FileDescriptorSet(
+        file=[
+            FileDescriptorProto(
+                name="c.proto",
+                enum_type=[dict(name="Color", value=[dict(name="RED", number=0)])],
+                extension=[dict(name="tag", number=100, extendee=".C")],
+            ),
+            FileDescriptorProto(
+                name="b.proto",
+                message_type=[dict(name="B")],
+                dependency=["c.proto"],
+                public_dependency=[0],
+            ),
+            FileDescriptorProto(
+                name="a.proto", dependency=["b.proto"], public_dependency=[0]
+            ),
+            FileDescriptorProto(name="k.proto", message_type=[dict(name="lambda")]),
+            FileDescriptorProto(
+                name="d.proto",
+                dependency=["k.proto", "missing.proto"],
+                public_dependency=[0, 1],
+            ),
+        ]
+    )
+    reexported = fdsetgen._ReexportedNames(fdset)
+    (reexport,) = reexported(fdset.file[2]).values()
+    assert reexport.names == ("B", "Color", "RED", "tag", "TAG_FIELD_NUMBER")
+    assert reexport.stub_names == ("B",)
+
+    # keywords can't be imported by name and missing files have unknown names
+    assert reexported(fdset.file[4]) == {}
+    rewriter = fdsetgen._build_rewriter(
+        fdset.file[4],
+        fdsetgen._GlobMatcher([]),
+        engine="ast",
+        verify_engine=None,
+        reexports=reexported(fdset.file[4]),
+    )
+    assert rewriter.rewrite("from k_pb2 import *\n") == "from .k_pb2 import *"
@@ -1,12 +1,25 @@
 from __future__ import annotations
 
 import collections
+import fnmatch
 import importlib
+import importlib.util
+import shutil
+import subprocess
 from typing import TYPE_CHECKING
 
+import pytest
+from google.protobuf.descriptor_pb2 import FileDescriptorProto, FileDescriptorSet
+
+from protoletariat import fdsetgen
+from protoletariat.__main__ import main
+from protoletariat.fdsetgen import Raw, Scan
+
 from .conftest import ProtoletariatFixture, check_import_lines
 
 if TYPE_CHECKING:
+    from pathlib import Path
+
     from click.testing import CliRunner
 
 
@@ -223,3 +236,219 @@ def test_ignored_imports(cli: CliRunner, ignored_imports: ProtoletariatFixture)
     custom_line = "import ignored_pb2 as ignored__pb2"
     assert google_line in lines
     assert custom_line in lines
+
+
+def test_watch(
+    cli: CliRunner,
+    basic_cli: ProtoletariatFixture,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    this_pb2 = basic_cli.package_dir.joinpath("this_pb2.py")
+    other_pb2 = basic_cli.package_dir.joinpath("other_pb2.py")
+    old_line = "import other_pb2 as other__pb2"
+    new_line = "from . import other_pb2 as other__pb2"
+    mtimes = []
+
+    def sleep(_: float) -> None:
+        if not mtimes:
+            # simulate regenerating a single module between passes
+            mtimes.append(other_pb2.stat().st_mtime_ns)
+            this_pb2.write_text(f"{old_line}\n")
+        else:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(fdsetgen.time, "sleep", sleep)
+
+    result = basic_cli.generate(cli, args=["--in-place", "--watch"])
+    assert result.exit_code == 0
+
+    assert this_pb2.read_text().splitlines() == [new_line]
+    # unchanged modules aren't rewritten again
+    assert other_pb2.stat().st_mtime_ns == mtimes[0]
+
+
+def test_rewrite_sources() -> None:
+    fdset = FileDescriptorSet(
+        file=[
+            FileDescriptorProto(name="a/b.proto", dependency=["c.proto"]),
+            FileDescriptorProto(name="c.proto"),
+        ]
+    )
+    sources = {
+        "a/b_pb2.py": "import c_pb2 as c__pb2\n",
+        "a/b_pb2.pyi": "import c_pb2\n",
+        "unrelated.py": "import c_pb2\n",
+    }
+    result = Raw(fdset.SerializeToString()).rewrite_sources(sources)
+    assert result == {
+        "a/b_pb2.py": "from .. import c_pb2 as c__pb2",
+        "a/b_pb2.pyi": "from .. import c_pb2",
+    }
+
+
+def test_scan(cli: CliRunner, basic_cli: ProtoletariatFixture) -> None:
+    # generate without rewriting anything
+    result = basic_cli.generate(cli)
+    assert result.exit_code == 0
+
+    result = cli.invoke(
+        main,
+        ["--python-out", str(basic_cli.package_dir), "--in-place", "scan"],
+        catch_exceptions=False,
+    )
+    assert result.exit_code == 0
+
+    lines = basic_cli.package_dir.joinpath("this_pb2.py").read_text().splitlines()
+    assert "from . import other_pb2 as other__pb2" in lines
+    assert "from .baz import bizz_buzz_pb2 as baz_dot_bizz__buzz__pb2" in lines
+
+    # scanning works on modules that have already been rewritten
+    fdset = FileDescriptorSet.FromString(
+        Scan(python_out=basic_cli.package_dir).generate_file_descriptor_set_bytes()
+    )
+    assert sorted(fd.name for fd in fdset.file) == sorted(
+        str(path.relative_to(basic_cli.base_dir)) for path, _ in basic_cli.proto_texts
+    )
+
+
+def test_protoc_descriptor_set_in(cli: CliRunner, tmp_path: Path) -> None:
+    if shutil.which("protoc") is None:
+        pytest.skip("protoc not found")
+
+    vendor = tmp_path / "vendor"
+    vendor.mkdir()
+    vendor.joinpath("b.proto").write_text('syntax = "proto3";\nmessage B {}\n')
+    vendored_fdset = tmp_path / "vendor.bin"
+    subprocess.run(  # noqa: S603
+        [  # noqa: S607
+            "protoc",
+            "--include_imports",
+            f"--descriptor_set_out={vendored_fdset}",
+            f"--proto_path={tmp_path}",
+            str(vendor / "b.proto"),
+        ],
+        check=True,
+    )
+    # the vendored sources are no longer needed
+    shutil.rmtree(vendor)
+
+    src = tmp_path / "src"
+    src.mkdir()
+    src.joinpath("a.proto").write_text(
+        'syntax = "proto3";\nimport "vendor/b.proto";\nmessage A { B b = 1; }\n'
+    )
+    out = tmp_path / "out"
+    out.mkdir()
+    subprocess.run(  # noqa: S603
+        [  # noqa: S607
+            "protoc",
+            f"--descriptor_set_in={vendored_fdset}",
+            f"--proto_path={src}",
+            f"--python_out={out}",
+            str(src / "a.proto"),
+        ],
+        check=True,
+    )
+
+    result = cli.invoke(
+        main,
+        [
+            "--python-out",
+            str(out),
+            "--in-place",
+            "protoc",
+            "--proto-path",
+            str(src),
+            "--descriptor-set-in",
+            str(vendored_fdset),
+            str(src / "a.proto"),
+        ],
+        catch_exceptions=False,
+    )
+    assert result.exit_code == 0
+
+    lines = out.joinpath("a_pb2.py").read_text().splitlines()
+    assert "from .vendor import b_pb2 as vendor_dot_b__pb2" in lines
+
+
+def test_timings(cli: CliRunner, basic_cli: ProtoletariatFixture) -> None:
+    result = basic_cli.generate(cli, args=["--in-place", "--timings", "-e", "vendor/*"])
+    assert result.exit_code == 0
+    phases = dict(line.split(": ", 1) for line in result.stderr.splitlines())
+    assert {"rewrite", "compile exclusions", "exclusion matching"} <= set(phases)
+    assert "2 patterns" in phases["exclusion matching"]
+
+
+def test_symlinked_package(cli: CliRunner, tmp_path: Path) -> None:
+    fdset = tmp_path / "fdset.bin"
+    fdset.write_bytes(
+        FileDescriptorSet(
+            file=[
+                FileDescriptorProto(name="a.proto", dependency=["sub/b.proto"]),
+                FileDescriptorProto(name="sub/b.proto", dependency=["sub/c.proto"]),
+                FileDescriptorProto(name="sub/c.proto"),
+            ]
+        ).SerializeToString()
+    )
+    real = tmp_path / "real" / "sub"
+    real.mkdir(parents=True)
+    real.joinpath("b_pb2.py").write_text("from sub import c_pb2 as sub_dot_c__pb2\n")
+    real.joinpath("c_pb2.py").write_text("")
+    out = tmp_path / "out"
+    out.mkdir()
+    out.joinpath("a_pb2.py").write_text("from sub import b_pb2 as sub_dot_b__pb2\n")
+    out.joinpath("sub").symlink_to(real, target_is_directory=True)
+
+    result = cli.invoke(
+        main,
+        ["--python-out", str(out), "--in-place", "raw", str(fdset)],
+        catch_exceptions=False,
+    )
+    assert result.exit_code == 0
+    assert out.joinpath("a_pb2.py").read_text() == (
+        "from .sub import b_pb2 as sub_dot_b__pb2"
+    )
+    # modules in the linked directory are rewritten too
+    assert real.joinpath("b_pb2.py").read_text() == (
+        "from ..sub import c_pb2 as sub_dot_c__pb2"
+    )
+
+
+@pytest.mark.parametrize(
+    "name",
+    [
+        "google/protobuf/empty",
+        "google/protobuf",
+        "vendor/a/b",
+        "vendor",
+        "a[b]",
+        "ab",
+        "line\nbreak",
+    ],
+)
+def test_glob_matcher(name: str) -> None:
+    patterns = ["google/protobuf/*", "vendor/*", "a[[]b]", "*\nbreak"]
+    matcher = fdsetgen._GlobMatcher(patterns)
+    expected = any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+    assert matcher(name) is expected
+    assert matcher(name) is expected
+    assert matcher.misses == 1
+
+
+@pytest.mark.parametrize("engine", ["tokenize", "regex"])
+def test_engine(cli: CliRunner, basic_cli: ProtoletariatFixture, engine: str) -> None:
+    result = basic_cli.generate(
+        cli,
+        args=[
+            "--in-place",
+            "--create-package",
+            "--engine",
+            engine,
+            "--verify-engine",
+            "ast",
+        ],
+    )
+    assert result.exit_code == 0
+
+    with basic_cli.patched_syspath:
+        importlib.import_module(f"{basic_cli.package_name}.this_pb2")
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import json
+from typing import TYPE_CHECKING
+
+from google.protobuf.descriptor_pb2 import FileDescriptorProto, FileDescriptorSet
+
+from protoletariat.__main__ import main
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from click.testing import CliRunner
+
+    from .conftest import ProtoletariatFixture
+
+
+def test_graph(cli: CliRunner, basic_cli: ProtoletariatFixture) -> None:
+    result = basic_cli.generate(cli, args=["--in-place"])
+    assert result.exit_code == 0
+
+    args = ["--python-out", str(basic_cli.package_dir), "graph"]
+    result = cli.invoke(main, [*args, "--format", "json"], catch_exceptions=False)
+    assert result.exit_code == 0
+    report = json.loads(result.stdout)
+    assert report["cycles"] == []
+    assert report["fan_out"][0] == ["this.proto", 2]
+    assert report["closure_sizes"]["this.proto"] == 2
+    assert report["closure_sizes"]["other.proto"] == 0
+
+    result = cli.invoke(main, [*args, "--format", "dot"], catch_exceptions=False)
+    assert result.exit_code == 0
+    assert '  "this.proto" -> "other.proto";' in result.stdout.splitlines()
+
+
+def test_graph_cycles(cli: CliRunner, tmp_path: Path) -> None:
+    # protoc rejects import cycles, but descriptor sets can still contain them
+    fdset = tmp_path / "fdset.bin"
+    fdset.write_bytes(
+        FileDescriptorSet(
+            file=[
+                FileDescriptorProto(name="a.proto", dependency=["b.proto"]),
+                FileDescriptorProto(name="b.proto", dependency=["a.proto"]),
+                FileDescriptorProto(name="c.proto", dependency=["a.proto"]),
+            ]
+        ).SerializeToString()
+    )
+
+    result = cli.invoke(main, ["graph", str(fdset)], catch_exceptions=False)
+    assert result.exit_code == 0
+    assert result.stdout.splitlines()[:2] == ["import cycles: 1", "  a.proto, b.proto"]
+
+    result = cli.invoke(main, ["graph", "-f", "dot", str(fdset)])
+    lines = result.stdout.splitlines()
+    assert '  "a.proto" -> "b.proto" [color=red];' in lines
+    assert '  "c.proto" -> "a.proto";' in lines
+
+
+def test_graph_deep_chain(cli: CliRunner, tmp_path: Path) -> None:
+    # deeper than the default recursion limit
+    depth = 1_500
+    fdset = tmp_path / "fdset.bin"
+    fdset.write_bytes(
+        FileDescriptorSet(
+            file=[
+                FileDescriptorProto(
+                    name=f"p{i}.proto",
+                    dependency=[f"p{i + 1}.proto"] if i + 1 < depth else [],
+                )
+                for i in range(depth)
+            ]
+        ).SerializeToString()
+    )
+
+    result = cli.invoke(
+        main, ["graph", "-f", "json", str(fdset)], catch_exceptions=False
+    )
+    assert result.exit_code == 0
+    (chain, *_) = json.loads(result.stdout)["chains"]
+    assert chain == [f"p{i}.proto" for i in range(depth)]
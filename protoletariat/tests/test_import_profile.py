@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from protoletariat.__main__ import main
+
+if TYPE_CHECKING:
+    from click.testing import CliRunner
+
+    from .conftest import ProtoletariatFixture
+
+
+def test_import_profile(cli: CliRunner, basic_cli: ProtoletariatFixture) -> None:
+    result = basic_cli.generate(cli, args=["--in-place", "--create-package"])
+    assert result.exit_code == 0
+
+    result = cli.invoke(
+        main,
+        ["--python-out", str(basic_cli.package_dir), "import-profile", "--top", "5"],
+        catch_exceptions=False,
+    )
+    assert result.exit_code == 0
+
+    package = basic_cli.package_name
+    modules, chains = result.stdout.split("\n\n")
+    assert {line.split()[0] for line in modules.splitlines()[1:]} >= {
+        f"{package}.this_pb2",
+        f"{package}.other_pb2",
+        f"{package}.baz.bizz_buzz_pb2",
+    }
+    assert len(chains.splitlines()) == 4
+    assert chains.splitlines()[1].split(maxsplit=1)[1] in {
+        "this.proto -> other.proto",
+        "this.proto -> baz/bizz_buzz.proto",
+        "this.proto -> baz/bizz-buzz.proto",
+    }
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import json
+import stat
+from typing import TYPE_CHECKING
+
+from protoletariat.__main__ import main
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from click.testing import CliRunner
+
+    from .conftest import ProtoletariatFixture
+
+
+def test_index(cli: CliRunner, basic_cli: ProtoletariatFixture, tmp_path: Path) -> None:
+    index = tmp_path / "index.json"
+    result = basic_cli.generate(cli, args=["--in-place", "--index", str(index)])
+    assert result.exit_code == 0
+
+    # readable by other users sharing the index
+    assert stat.S_IMODE(index.stat().st_mode) == 0o644
+    files = json.loads(index.read_text())["files"]
+    assert files["this.proto"]["deps"][0] == "other.proto"
+    assert files["other.proto"]["rdeps"] == ["this.proto"]
+    assert list(files["other.proto"]["modules"]) == ["_pb2.py"]
+
+    this_pb2 = basic_cli.package_dir.joinpath("this_pb2.py")
+    other_pb2 = basic_cli.package_dir.joinpath("other_pb2.py")
+    old_line = "import other_pb2 as other__pb2"
+    new_line = "from . import other_pb2 as other__pb2"
+    this_pb2.write_text(this_pb2.read_text().replace(new_line, old_line))
+
+    # use descriptors embedded in the modules to avoid regenerating them
+    args = ["--python-out", str(basic_cli.package_dir), "--in-place"]
+    result = cli.invoke(
+        main, [*args, "--changed", "other.proto", "scan"], catch_exceptions=False
+    )
+    assert result.exit_code == 0
+    assert old_line in this_pb2.read_text().splitlines()
+
+    mtime = other_pb2.stat().st_mtime_ns
+
+    result = cli.invoke(
+        main, [*args, "--index", str(index), "scan"], catch_exceptions=False
+    )
+    assert result.exit_code == 0
+    assert new_line in this_pb2.read_text().splitlines()
+    # unchanged modules aren't rewritten
+    assert other_pb2.stat().st_mtime_ns == mtime
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import concurrent.futures
+from typing import TYPE_CHECKING
+
+import pytest
+from google.protobuf.descriptor_pb2 import FileDescriptorProto, FileDescriptorSet
+
+from protoletariat import fdsetgen
+
+if TYPE_CHECKING:
+    from click.testing import CliRunner
+
+    from .conftest import ProtoletariatFixture
+
+
+@pytest.mark.parametrize("executor", fdsetgen.EXECUTORS)
+def test_jobs(cli: CliRunner, basic_cli: ProtoletariatFixture, executor: str) -> None:
+    serial = basic_cli.generate(cli)
+    assert serial.exit_code == 0
+
+    result = basic_cli.generate(cli, args=["--jobs", "2", "--executor", executor])
+    assert result.exit_code == 0
+    # outputs are written in the same order as when rewriting serially
+    assert result.stdout == serial.stdout
+
+
+def test_rewriter_is_reentrant() -> None:
+    fd = FileDescriptorProto(name="a/b.proto", dependency=["c.proto"])
+    rewriter = fdsetgen.RewriteCache().rewriter(fd, ())
+    source = "import c_pb2 as c__pb2\nimport c_pb2 as c__pb2\n" * 50
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+        results = set(pool.map(rewriter.rewrite, [source] * 64))
+    assert results == {"from .. import c_pb2 as c__pb2"}
+
+
+def test_rewrite_cache_is_thread_safe() -> None:
+    # evict on every miss so that threads race on lookups and evictions
+    cache = fdsetgen.RewriteCache(max_descriptor_sets=1)
+    fdsets = [
+        FileDescriptorSet(file=[FileDescriptorProto(name=f"{i}.proto")])
+        for i in range(4)
+    ]
+    inputs = [fdset.SerializeToString() for fdset in fdsets] * 256
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(cache.file_descriptor_set, inputs))
+    assert results == fdsets * 256
+    assert len(cache.fdsets) == 1
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from click.testing import CliRunner
+
+    from .conftest import ProtoletariatFixture
+
+
+def test_lazy_init(cli: CliRunner, basic_cli: ProtoletariatFixture) -> None:
+    result = basic_cli.generate(
+        cli, args=["--in-place", "--create-package", "--lazy-init"]
+    )
+    assert result.exit_code == 0
+
+    package = basic_cli.package_name
+    script = f"""\
+import sys
+import {package}
+assert "{package}.this_pb2" not in sys.modules
+assert "this_pb2" in dir({package})
+assert {package}.this_pb2.Test.DESCRIPTOR.name == "Test"
+from {package}.baz import bizz_buzz_pb2
+assert "{package}.baz.bizz_buzz_pb2" in sys.modules
+"""
+    subprocess.run(  # noqa: S603
+        [sys.executable, "-c", script], cwd=basic_cli.base_dir, check=True
+    )
+
+    # regenerating leaves the generated files alone
+    init_py = basic_cli.package_dir.joinpath("__init__.py")
+    stat = init_py.stat()
+    result = basic_cli.generate(
+        cli, args=["--in-place", "--create-package", "--lazy-init"]
+    )
+    assert result.exit_code == 0
+    assert init_py.stat().st_mtime_ns == stat.st_mtime_ns
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import concurrent.futures
+from typing import TYPE_CHECKING
+
+import pytest
+
+from protoletariat import fdsetgen
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+def test_concurrent_create_package(tmp_path: Path) -> None:
+    names = [f"sub{i}" for i in range(32)]
+
+    def generate(name: str) -> None:
+        package = tmp_path / name
+        package.mkdir()
+        for suffix in fdsetgen.DEFAULT_MODULE_SUFFIXES:
+            package.joinpath(f"{name}{suffix}").touch()
+        fdsetgen._create_package(
+            tmp_path, fdsetgen.DEFAULT_MODULE_SUFFIXES, packages=[package]
+        )
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(generate, names))
+
+    lines = tmp_path.joinpath("__init__.pyi").read_text().splitlines()
+    assert sorted(lines) == [f"from . import {name}" for name in sorted(names)]
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        ["__init__.py", "__init__.pyi", *names]
+    )
+
+
+def test_create_package_waits_for_lock(tmp_path: Path) -> None:
+    tmp_path.joinpath("a_pb2.pyi").touch()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+        with fdsetgen.lock_directory(tmp_path):
+            future = pool.submit(fdsetgen._create_package, tmp_path, ["_pb2.pyi"])
+            with pytest.raises(concurrent.futures.TimeoutError):
+                future.result(timeout=0.2)
+            assert not tmp_path.joinpath("__init__.pyi").exists()
+        future.result()
+    assert tmp_path.joinpath("__init__.pyi").read_text() == "from . import a_pb2\n"
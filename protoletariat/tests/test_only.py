@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from click.testing import CliRunner
+
+    from .conftest import ProtoletariatFixture
+
+
+def test_only(cli: CliRunner, basic_cli: ProtoletariatFixture, tmp_path: Path) -> None:
+    this_pb2 = basic_cli.package_dir.joinpath("this_pb2.py")
+
+    # unlike excluded files, files that aren't selected are still imported
+    result = basic_cli.generate(cli, args=["--in-place", "--only", "*other*"])
+    assert result.exit_code == 0
+    assert "import other_pb2 as other__pb2" in this_pb2.read_text().splitlines()
+
+    only_from = tmp_path / "only.txt"
+    only_from.write_text("# modules to rewrite\n\nthis_pb2.py\n")
+    result = basic_cli.generate(
+        cli, args=["--in-place", "--create-package", "--only-from", str(only_from)]
+    )
+    assert result.exit_code == 0
+    assert "from . import other_pb2 as other__pb2" in this_pb2.read_text().splitlines()
+    assert basic_cli.package_dir.joinpath("__init__.py").exists()
+    assert not basic_cli.package_dir.joinpath("baz", "__init__.py").exists()
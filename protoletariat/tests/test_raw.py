@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import shutil
+import subprocess
+from typing import TYPE_CHECKING
+
+import pytest
+from google.protobuf.descriptor_pb2 import FileDescriptorProto, FileDescriptorSet
+
+from protoletariat import fdsetgen
+from protoletariat.__main__ import main
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from click.testing import CliRunner
+
+
+def test_raw_merges_descriptor_sets(cli: CliRunner, tmp_path: Path) -> None:
+    if shutil.which("protoc") is None:
+        pytest.skip("protoc not found")
+
+    tmp_path.joinpath("common.proto").write_text(
+        'syntax = "proto3";\nmessage Common {}\n'
+    )
+    out = tmp_path / "out"
+    out.mkdir()
+    fdsets = []
+    for name in "ab":
+        tmp_path.joinpath(f"{name}.proto").write_text(
+            'syntax = "proto3";\nimport "common.proto";\n'
+            f"message {name.upper()} {{ Common common = 1; }}\n"
+        )
+        fdset = tmp_path / f"{name}.bin"
+        subprocess.run(  # noqa: S603
+            [  # noqa: S607
+                "protoc",
+                "--include_imports",
+                f"--descriptor_set_out={fdset}",
+                f"--proto_path={tmp_path}",
+                f"--python_out={out}",
+                str(tmp_path / f"{name}.proto"),
+            ],
+            check=True,
+        )
+        fdsets.append(str(fdset))
+
+    result = cli.invoke(main, ["--python-out", str(out), "--in-place", "raw", *fdsets])
+    assert result.exit_code == 0, result.output
+    for name in "ab":
+        lines = out.joinpath(f"{name}_pb2.py").read_text().splitlines()
+        assert "from . import common_pb2 as common__pb2" in lines
+
+
+def test_merge_file_descriptor_sets() -> None:
+    def serialize(*fds: FileDescriptorProto) -> bytes:
+        return FileDescriptorSet(file=fds).SerializeToString()
+
+    common = FileDescriptorProto(name="common.proto")
+    a = FileDescriptorProto(name="a.proto", dependency=["common.proto"])
+    b = FileDescriptorProto(name="b.proto", dependency=["common.proto"])
+
+    merged = FileDescriptorSet.FromString(
+        fdsetgen.merge_file_descriptor_sets(
+            [serialize(common, a), serialize(common, b)]
+        )
+    )
+    assert [fd.name for fd in merged.file] == ["common.proto", "a.proto", "b.proto"]
+
+    conflicting = FileDescriptorProto(name="common.proto", package="other")
+    with pytest.raises(
+        fdsetgen.DescriptorSetConflictError, match=r"sets 0 and 1 .* common\.proto"
+    ):
+        fdsetgen.merge_file_descriptor_sets(
+            [serialize(common, a), serialize(conflicting, b)]
+        )
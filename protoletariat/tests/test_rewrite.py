@@ -1,15 +1,25 @@
 from __future__ import annotations
 
+import ast
 import itertools
 from typing import TYPE_CHECKING
 
 import pytest
 
-from protoletariat.rewrite import build_rewrites
+from protoletariat.rewrite import (
+    ENGINES,
+    CrossValidatingRewriter,
+    EngineMismatchError,
+    astunparse,
+    build_rewrites,
+    unparse_import,
+)
 
 if TYPE_CHECKING:
     from collections.abc import Iterable
 
+    from protoletariat.rewrite import ImportRewriter
+
 
 @pytest.mark.parametrize(
     ("proto", "dep", "expecteds"),
@@ -113,3 +123,76 @@ def test_build_import_rewrites(proto: str, dep: str, expecteds: Iterable[str]) -
     rewrites = build_rewrites(proto, dep)
     for (_, new), expected in itertools.zip_longest(rewrites, expecteds):
         assert new == expected
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "import a",
+        "import a.b.c",
+        "import a as b, c.d as e, f",
+        "from a import b",
+        "from a.b import c as d, e",
+        "from . import a",
+        "from .. import a as b",
+        "from ...a.b import *",
+        "from __future__ import annotations",
+        *(
+            code
+            for replacement in build_rewrites("a/b_c", "d_e/f/g", is_public=True)
+            for code in replacement
+        ),
+    ],
+)
+def test_unparse_import(code: str) -> None:
+    (node,) = ast.parse(code).body
+    assert isinstance(node, (ast.Import, ast.ImportFrom))
+    assert unparse_import(node) == astunparse(node).strip()
+
+
+GENERATED = '''\
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+import foo_pb2 as foo__pb2  # comment
+from bar import baz_pb2 as bar_dot_baz__pb2
+import foo.bar_pb2
+import foo_pb2 as foo__pb2
+
+DESCRIPTOR = _descriptor.FileDescriptor(name="a/b.proto")
+'''
+
+
+def _rewriter(engine: str) -> ImportRewriter:
+    rewriter = ENGINES[engine]()
+    for dep in ("foo", "bar/baz"):
+        for replacement in build_rewrites("a/b", dep):
+            rewriter.register_rewrite(replacement)
+    return rewriter
+
+
+@pytest.mark.parametrize("engine", list(ENGINES))
+def test_engines(engine: str) -> None:
+    result = _rewriter(engine).rewrite(GENERATED)
+    expected = _rewriter("ast").rewrite(GENERATED)
+    assert ast.dump(ast.parse(result)) == ast.dump(ast.parse(expected))
+    assert "from .. import foo_pb2 as foo__pb2" in result
+    assert result.count("foo__pb2") == 1
+    if engine != "ast":
+        # only import statements are touched
+        assert result.startswith('"""Generated protocol buffer code."""\n')
+        assert "from .. import foo_pb2 as foo__pb2  # comment" in result
+
+
+def test_cross_validation() -> None:
+    src = 'x = """\nimport foo_pb2 as foo__pb2\n"""\nimport foo_pb2 as foo__pb2\n'
+    rewriter = CrossValidatingRewriter(
+        _rewriter("tokenize"), _rewriter("ast"), name="a/b.proto"
+    )
+    assert rewriter.rewrite(src).endswith("from .. import foo_pb2 as foo__pb2\n")
+
+    # the regex engine rewrites the string and drops the real import
+    rewriter = CrossValidatingRewriter(
+        _rewriter("regex"), _rewriter("ast"), name="a/b.proto"
+    )
+    with pytest.raises(EngineMismatchError, match=r"a/b\.proto: imports"):
+        rewriter.rewrite(src)
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import pytest
+
+if TYPE_CHECKING:
+    from click.testing import CliRunner
+
+    from .conftest import ProtoletariatFixture
+
+
+@pytest.mark.parametrize("prune", [False, True], ids=["skip", "prune"])
+def test_roots(cli: CliRunner, basic_cli: ProtoletariatFixture, prune: bool) -> None:
+    this_pb2 = basic_cli.package_dir.joinpath("this_pb2.py")
+    other_pb2 = basic_cli.package_dir.joinpath("other_pb2.py")
+    bizz_buzz_pb2 = basic_cli.package_dir.joinpath("baz", "bizz_buzz_pb2.py")
+
+    args = ["--in-place", "--root", "other.proto"]
+    result = basic_cli.generate(cli, args=[*args, "--prune"] if prune else args)
+    assert result.exit_code == 0
+
+    assert other_pb2.exists()
+    assert this_pb2.exists() is not prune
+    assert bizz_buzz_pb2.exists() is not prune
+    if not prune:
+        # unreachable modules aren't rewritten
+        assert "import other_pb2 as other__pb2" in this_pb2.read_text().splitlines()
+
+    # roots pull in everything they import
+    result = basic_cli.generate(cli, args=["--in-place", "--root", "this.proto"])
+    assert result.exit_code == 0
+    assert "from . import other_pb2 as other__pb2" in this_pb2.read_text().splitlines()
+
+
+def test_prune_updates_init_stubs(
+    cli: CliRunner, basic_cli: ProtoletariatFixture
+) -> None:
+    init_pyi = basic_cli.package_dir.joinpath("__init__.pyi")
+    init_pyi.write_text("from . import other_pb2\nfrom . import this_pb2")
+
+    result = basic_cli.generate(
+        cli, args=["--in-place", "--root", "other.proto", "--prune"]
+    )
+    assert result.exit_code == 0
+    assert not basic_cli.package_dir.joinpath("this_pb2.py").exists()
+    lines = init_pyi.read_text().splitlines()
+    assert "from . import other_pb2" in lines
+    assert "from . import this_pb2" not in lines
+
+
+def test_unmatched_roots(cli: CliRunner, basic_cli: ProtoletariatFixture) -> None:
+    result = basic_cli.generate(
+        cli, args=["--in-place", "--root", "othr.proto", "--prune"]
+    )
+    assert result.exit_code == 1
+    assert "no file in the descriptor set matches roots" in result.output
+    # nothing is pruned
+    assert basic_cli.package_dir.joinpath("this_pb2.py").exists()
+    assert basic_cli.package_dir.joinpath("other_pb2.py").exists()
+
+
+def test_prune_requires_root(cli: CliRunner, basic_cli: ProtoletariatFixture) -> None:
+    result = basic_cli.generate(cli, args=["--in-place", "--prune"])
+    assert result.exit_code == 2
+    assert "--prune requires --root and --in-place" in result.output
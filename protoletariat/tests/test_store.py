@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import importlib.util
+import os
+import shutil
+import stat
+from typing import TYPE_CHECKING
+
+import pytest
+from google.protobuf.descriptor_pb2 import FileDescriptorProto
+
+from protoletariat.__main__ import main
+from protoletariat.store import LINK_MODES, OutputStore
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+    from click.testing import CliRunner
+
+    from .conftest import ProtoletariatFixture
+
+
+@pytest.mark.parametrize("link", LINK_MODES)
+def test_store(
+    cli: CliRunner, basic_cli: ProtoletariatFixture, tmp_path: Path, link: str
+) -> None:
+    # generate code without rewriting it
+    result = basic_cli.generate(cli, args=["--check"])
+    assert result.exit_code == 1
+    trees = [basic_cli.package_dir, tmp_path / "worktree"]
+    shutil.copytree(trees[0], trees[1])
+
+    store = tmp_path / "store"
+    for tree in trees:
+        result = cli.invoke(
+            main,
+            [
+                "--python-out",
+                str(tree),
+                "--in-place",
+                "--timings",
+                "--compile-bytecode",
+                "--store",
+                str(store),
+                "--store-link",
+                link,
+                "scan",
+            ],
+            catch_exceptions=False,
+        )
+        assert result.exit_code == 0
+
+    # the second tree is only materialized from the store
+    assert "materialize stored modules" in result.stderr
+    first, second = (tree.joinpath("this_pb2.py") for tree in trees)
+    assert "from . import other_pb2 as other__pb2" in second.read_text().splitlines()
+    assert second.read_text() == first.read_text()
+    assert os.path.samefile(first, second) is (link == "hardlink")
+    # only hardlinked modules share the read-only mode of their object
+    read_only = not second.stat().st_mode & stat.S_IWUSR
+    assert read_only is (link == "hardlink")
+    assert os.path.exists(importlib.util.cache_from_source(os.fspath(second)))
+
+
+def test_store_requires_in_place(
+    cli: CliRunner, basic_cli: ProtoletariatFixture, tmp_path: Path
+) -> None:
+    result = basic_cli.generate(cli, args=["--store", str(tmp_path / "store")])
+    assert result.exit_code == 2
+    assert "--store requires --in-place" in result.output
+
+
+def test_modified_objects_are_ignored(tmp_path: Path) -> None:
+    store = OutputStore(tmp_path, params=dict(engine="ast"))
+    key = store.key(FileDescriptorProto(name="a.proto"), "import b_pb2\n")
+    assert store.get(key) is None
+
+    obj = store.put(key, "from . import b_pb2\n")
+    assert store.get(key) == obj
+    assert obj.read_text() == "from . import b_pb2\n"
+
+    # e.g., protoc writing to a module hardlinked to the object
+    obj.chmod(0o644)
+    obj.write_text("import b_pb2\n")
+    assert store.get(key) is None
+    assert store.put(key, "from . import b_pb2\n") == obj
+    assert store.get(key) == obj
@@ -0,0 +1,54 @@
+"""Wall-clock timings of the phases of fixing imports."""
+
+from __future__ import annotations
+
+import contextlib
+import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+
+class Timings:
+    """Accumulate the time spent in named phases.
+
+    Examples
+    --------
+    >>> timings = Timings()
+    >>> timings.add("rewrite", 0.25)
+    >>> timings.add("exclusion matching", 0.0015, detail="3 lookups")
+    >>> print(timings.report())
+    rewrite: 250.000 ms
+    exclusion matching: 1.500 ms (3 lookups)
+    """
+
+    def __init__(self) -> None:
+        self.seconds: dict[str, float] = {}
+        self.details: dict[str, str] = {}
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Add the time spent in the body of the ``with`` statement to `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float, *, detail: str = "") -> None:
+        """Add `seconds` to the phase `name`, replacing its detail if given."""
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        if detail:
+            self.details[name] = detail
+
+    def report(self) -> str:
+        """Format one line per phase, in the order phases were first seen."""
+        lines = []
+        for name, seconds in self.seconds.items():
+            line = f"{name}: {seconds * 1000:.3f} ms"
+            detail = self.details.get(name)
+            if detail:
+                line += f" ({detail})"
+            lines.append(line)
+        return "\n".join(lines)